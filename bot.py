@@ -1,6 +1,9 @@
 import logging
+import logging.handlers
+import queue
+import re
 from telegram.ext import (
-    Application, CommandHandler, CallbackQueryHandler, MessageHandler,
+    AIORateLimiter, Application, CommandHandler, CallbackQueryHandler, MessageHandler,
     filters, ConversationHandler
 )
 from telegram import Update
@@ -11,12 +14,12 @@ from handlers.admin import (
     profile_facetime_payment, profile_custom_payment, profile_custom_delivery,
     profile_other_service, profile_about, profile_contact_method,
     profile_contact_info, profile_social_links, profile_rates,
-    profile_disclaimer, profile_allow_comments, profile_photos,
-    profile_videos, profile_preview, profile_save, profile_cancel,
-    admin_available_command, post_listing_callback, bump_command,
+    profile_disclaimer, profile_allow_comments, profile_photos_done, profile_photos,
+    profile_videos_done, profile_videos, profile_preview, profile_preview_action, profile_cancel,
+    available_command, post_listing_callback, bump_command,
     bump_execute_callback
 )
-from handlers.member import member_available_command
+from db import init_db, close_db
 from scheduler import start_scheduler, stop_scheduler
 from utils.constants import (
     TELEGRAM_BOT_TOKEN, STATE_NAME, STATE_SERVICES, STATE_INPERSON,
@@ -25,75 +28,119 @@ from utils.constants import (
     STATE_RATES, STATE_DISCLAIMER, STATE_ALLOW_COMMENTS, STATE_PHOTOS,
     STATE_VIDEOS, STATE_PREVIEW,
     STATE_INPERSON_LOCATION, STATE_FACETIME_PAYMENT, STATE_CUSTOM_DELIVERY,
-
+    TELEGRAM_HTTP_POOL_SIZE, TELEGRAM_HTTP_POOL_TIMEOUT_SECONDS, TELEGRAM_FLOOD_MAX_RETRIES,
 )
 
 # Enable logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s", level=logging.INFO
-)
+# Handlers only enqueue records; a listener thread does the formatting and stdout writes
+_log_queue = queue.SimpleQueue()
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_stream)
+logging.basicConfig(handlers=[logging.handlers.QueueHandler(_log_queue)], level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# --- Callback Query Patterns (compiled once) ---
+P_PROFILE_EDIT = re.compile(r"^profile_edit$")
+P_SERVICE = re.compile(r"^service_")
+P_INPERSON = re.compile(r"^inperson_")
+P_CONTACT = re.compile(r"^contact_")
+P_COMMENTS = re.compile(r"^comments_")
+# One handler for the three preview buttons; it branches on the captured action
+P_PREVIEW_ACTION = re.compile(r"^profile_(save|edit_restart|cancel)$")
+P_PROFILE_DELETE = re.compile(r"^profile_delete$")
+P_PROFILE_DELETE_CONFIRM = re.compile(r"^profile_delete_confirm$")
+P_DURATION = re.compile(r"^duration_")
+P_BUMP = re.compile(r"^bump_")
+
+# --- Rate Limiting ---
+# Endpoints that only touch messages already in the chat. Telegram's 20/min per-group limit is
+# on new messages, so these skip that bucket and are paced by the overall 30/s one only;
+# otherwise the scheduler's countdown edits would queue admin replies and listing posts.
+_UNGROUPED_ENDPOINTS = frozenset({"editMessageText", "editMessageCaption", "deleteMessage", "deleteMessages"})
+
+class _ListingRateLimiter(AIORateLimiter):
+    """AIORateLimiter that leaves edits and deletes out of the per-group bucket."""
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        if endpoint in _UNGROUPED_ENDPOINTS:
+            # The limiter picks its buckets from chat_id: any chat_id puts the call in the overall
+            # bucket, a negative one in that group's bucket too. A non-negative stand-in keeps
+            # only the former; the request itself still sends the real chat_id via args.
+            data = {**data, "chat_id": 0}
+        return await super().process_request(callback, args, kwargs, endpoint, data, rate_limit_args)
+
+async def post_init(application: Application) -> None:
+    """Sets up resources that need the running event loop."""
+    # The async Supabase client must exist before any handler or job queries the DB
+    await init_db()
+
+    # --- Start Scheduler ---
+    # The scheduler needs the bot instance to send messages
+    start_scheduler(application.bot)
+
+async def post_shutdown(application: Application) -> None:
+    """Releases resources set up in post_init."""
+    # Stop the jobs while the loop is still running, before the DB pool they use is closed
+    stop_scheduler()
+    await close_db()
+
 def main() -> None:
     """Start the bot."""
+    _log_listener.start()
+
     # Create the Application and pass your bot's token.
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    # The rate limiter keeps concurrent calls within Telegram's flood limits (30/s overall for
+    # every call, plus 20/min per group for new messages; edits and deletes skip that one)
+    # instead of bursting into 429s. A 429 that still gets through pauses all calls for
+    # its Retry-After and is then retried.
+    # API calls share keep-alive HTTP/2 connections, so a burst of countdown edits is
+    # multiplexed instead of queueing for a free connection; getUpdates keeps its own.
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .http_version("2")
+        .connection_pool_size(TELEGRAM_HTTP_POOL_SIZE)
+        .pool_timeout(TELEGRAM_HTTP_POOL_TIMEOUT_SECONDS)
+        .rate_limiter(_ListingRateLimiter(max_retries=TELEGRAM_FLOOD_MAX_RETRIES))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # --- Conversation Handler for Profile Creation ---
     profile_wizard_handler = ConversationHandler(
         entry_points=[
             CommandHandler("createprofile", create_profile_start, filters=filters.ChatType.PRIVATE),
-            CallbackQueryHandler(create_profile_start, pattern="^profile_edit$"),
+            CallbackQueryHandler(create_profile_start, pattern=P_PROFILE_EDIT),
         ],
         states={
             STATE_NAME: [MessageHandler(filters.TEXT & ~filters.COMMAND, profile_name)],
-            STATE_SERVICES: [CallbackQueryHandler(profile_services_callback, pattern="^service_")],
-            STATE_INPERSON: [
-                CallbackQueryHandler(profile_inperson_type, pattern="^inperson_"),
-               
-            ],
-            STATE_FACETIME: [
-                MessageHandler(filters.TEXT & ~filters.COMMAND, profile_facetime_platforms),
-
-                        STATE_CUSTOM: [
-            MessageHandler(filters.TEXT & ~filters.COMMAND, profile_custom_payment),
-        ],
-            ],
-        
-                        
-             
-                
-            ],
+            STATE_SERVICES: [CallbackQueryHandler(profile_services_callback, pattern=P_SERVICE)],
+            STATE_INPERSON: [CallbackQueryHandler(profile_inperson_type, pattern=P_INPERSON)],
+            STATE_INPERSON_LOCATION: [MessageHandler(filters.TEXT & ~filters.COMMAND, profile_inperson_location)],
+            STATE_FACETIME: [MessageHandler(filters.TEXT & ~filters.COMMAND, profile_facetime_platforms)],
+            STATE_FACETIME_PAYMENT: [MessageHandler(filters.TEXT & ~filters.COMMAND, profile_facetime_payment)],
+            STATE_CUSTOM: [MessageHandler(filters.TEXT & ~filters.COMMAND, profile_custom_payment)],
+            STATE_CUSTOM_DELIVERY: [MessageHandler(filters.TEXT & ~filters.COMMAND, profile_custom_delivery)],
             STATE_OTHER: [MessageHandler(filters.TEXT & ~filters.COMMAND, profile_other_service)],
-                    STATE_INPERSON_LOCATION: [
-            MessageHandler(filters.TEXT & ~filters.COMMAND, profile_inperson_location),
-        ],
-        STATE_FACETIME_PAYMENT: [
-            MessageHandler(filters.TEXT & ~filters.COMMAND, profile_facetime_payment),
-        ],
-        STATE_CUSTOM_DELIVERY: [
-            MessageHandler(filters.TEXT & ~filters.COMMAND, profile_custom_delivery),
-        ],
-
             STATE_ABOUT: [MessageHandler(filters.TEXT & ~filters.COMMAND, profile_about)],
-            STATE_CONTACT_METHOD: [CallbackQueryHandler(profile_contact_method, pattern="^contact_")],
+            STATE_CONTACT_METHOD: [CallbackQueryHandler(profile_contact_method, pattern=P_CONTACT)],
             STATE_CONTACT_INFO: [MessageHandler(filters.TEXT, profile_contact_info)],
             STATE_SOCIAL_LINKS: [MessageHandler(filters.TEXT, profile_social_links)],
             STATE_RATES: [MessageHandler(filters.TEXT & ~filters.COMMAND, profile_rates)],
             STATE_DISCLAIMER: [MessageHandler(filters.TEXT, profile_disclaimer)],
-            STATE_ALLOW_COMMENTS: [CallbackQueryHandler(profile_allow_comments, pattern="^comments_")],
+            STATE_ALLOW_COMMENTS: [CallbackQueryHandler(profile_allow_comments, pattern=P_COMMENTS)],
             STATE_PHOTOS: [
-                MessageHandler(filters.PHOTO | filters.Document.IMAGE | filters.Regex("^/done$"), profile_photos),
+                CommandHandler("done", profile_photos_done, filters=filters.ChatType.PRIVATE),
+                MessageHandler(filters.PHOTO | filters.Document.IMAGE, profile_photos),
                 CommandHandler("skip_media", profile_photos), # Allow skipping media
             ],
             STATE_VIDEOS: [
-                MessageHandler(filters.VIDEO | filters.Regex("^/done$"), profile_videos),
-            ],
-            STATE_PREVIEW: [
-                CallbackQueryHandler(profile_save, pattern="^profile_save$"),
-                CallbackQueryHandler(create_profile_start, pattern="^profile_edit_restart$"),
-                CallbackQueryHandler(profile_cancel, pattern="^profile_cancel$"),
+                CommandHandler("done", profile_videos_done, filters=filters.ChatType.PRIVATE),
+                MessageHandler(filters.VIDEO, profile_videos),
             ],
+            STATE_PREVIEW: [CallbackQueryHandler(profile_preview_action, pattern=P_PREVIEW_ACTION)],
         },
         fallbacks=[
             CommandHandler("cancel", profile_cancel),
@@ -103,34 +150,29 @@ def main() -> None:
     )
     application.add_handler(profile_wizard_handler)
 
+    # Handlers outside the wizard don't block: PTB runs them as concurrent tasks, so a slow
+    # Telegram/Supabase round trip in one update doesn't hold up the next. The wizard stays
+    # blocking because its state transitions must be processed in order.
+
     # --- Admin Private Chat Handlers ---
-    application.add_handler(CommandHandler("start", start_command, filters=filters.ChatType.PRIVATE))
-    application.add_handler(CallbackQueryHandler(delete_profile_confirm, pattern="^profile_delete$"))
-    application.add_handler(CallbackQueryHandler(delete_profile_execute, pattern="^profile_delete_confirm$"))
+    application.add_handler(CommandHandler("start", start_command, filters=filters.ChatType.PRIVATE, block=False))
+    application.add_handler(CallbackQueryHandler(delete_profile_confirm, pattern=P_PROFILE_DELETE, block=False))
+    application.add_handler(CallbackQueryHandler(delete_profile_execute, pattern=P_PROFILE_DELETE_CONFIRM, block=False))
     
-    # --- Admin Group Chat Handlers ---
-    # /available command (for posting a new listing)
-    application.add_handler(CommandHandler("available", admin_available_command, filters=filters.ChatType.GROUPS))
-    application.add_handler(CallbackQueryHandler(post_listing_callback, pattern="^duration_"))
+    # --- Group Chat Handlers ---
+    # /available command: admins post a new listing, members refresh the chat list
+    application.add_handler(CommandHandler("available", available_command, filters=filters.ChatType.GROUPS, block=False))
+    application.add_handler(CallbackQueryHandler(post_listing_callback, pattern=P_DURATION, block=False))
     
     # /bump command
-    application.add_handler(CommandHandler("bump", bump_command, filters=filters.ChatType.GROUPS))
-    application.add_handler(CallbackQueryHandler(bump_execute_callback, pattern="^bump_"))
-
-    # --- Member Group Chat Handlers ---
-    # /available command (for refreshing the chat list)
-    application.add_handler(CommandHandler("available", member_available_command, filters=filters.ChatType.GROUPS))
-
-    # --- Start Scheduler ---
-    # The scheduler needs the bot instance to send messages
-    start_scheduler(application.bot)
+    application.add_handler(CommandHandler("bump", bump_command, filters=filters.ChatType.GROUPS, block=False))
+    application.add_handler(CallbackQueryHandler(bump_execute_callback, pattern=P_BUMP, block=False))
 
     # Run the bot until the user presses Ctrl-C
     logger.info("Bot started. Press Ctrl-C to stop.")
     application.run_polling(stop_signals=None)
     
-    # --- Stop Scheduler on Exit ---
-    stop_scheduler()
+    _log_listener.stop()
 
 if __name__ == "__main__":
     main()
@@ -1,139 +1,414 @@
-from supabase import create_client, Client
-from datetime import datetime, timezone
+from supabase import acreate_client, AsyncClient, AsyncClientOptions
+from postgrest.exceptions import APIError
+from aiolimiter import AsyncLimiter
+from cachetools import TTLCache
+from tenacity import (
+    before_sleep_log, retry, retry_if_exception, stop_after_attempt, wait_random_exponential
+)
+import httpx
+from typing import Any, Awaitable, Callable, Hashable
+import asyncio
+import copy
+import logging
+import time
 from utils.constants import (
     SUPABASE_URL, SUPABASE_KEY, TABLE_PROFILES, TABLE_ACTIVE_LISTINGS,
-    TABLE_LIST_MESSAGES, LIST_TYPE_PINNED, LIST_TYPE_CHAT
+    TABLE_LIST_MESSAGES, LIST_TYPE_PINNED, LIST_TYPE_CHAT,
+    PROFILE_LIST_COLUMNS, CACHE_MAX_SIZE, CACHE_TTL_SECONDS, PROFILE_CACHE_TTL_SECONDS, LIST_MESSAGE_CACHE_TTL_SECONDS, LOADER_BATCH_DELAY_SECONDS, LOADER_MAX_BATCH,
+    DB_HTTP_MAX_CONNECTIONS, DB_HTTP_MAX_KEEPALIVE_CONNECTIONS, DB_HTTP_TIMEOUT_SECONDS,
+    DB_RETRY_ATTEMPTS, DB_RETRY_MAX_WAIT_SECONDS, DB_RATE_LIMIT_REQUESTS, DB_RATE_LIMIT_PERIOD_SECONDS
 )
 
-# Initialize Supabase Client
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+logger = logging.getLogger(__name__)
+
+# Supabase Client (created by init_db() once the event loop is running)
+supabase: AsyncClient | None = None
+# Shared keep-alive connection pool used by every Supabase sub-client
+_http_client: httpx.AsyncClient | None = None
+
+async def init_db() -> None:
+    """Creates the async Supabase client. Must be awaited before any query."""
+    global supabase, _http_client
+    # Reuse warm connections instead of paying a TCP+TLS handshake per request.
+    # HTTP/2 multiplexes concurrent queries over one connection; httpx already asks for
+    # gzip responses (Accept-Encoding) and decodes them transparently.
+    _http_client = httpx.AsyncClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=DB_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=DB_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(DB_HTTP_TIMEOUT_SECONDS),
+        event_hooks={"response": [_record_retry_after]},
+    )
+    supabase = await acreate_client(
+        SUPABASE_URL, SUPABASE_KEY, options=AsyncClientOptions(httpx_client=_http_client)
+    )
+
+async def close_db() -> None:
+    """Closes the pooled HTTP connections."""
+    if _http_client is not None:
+        await _http_client.aclose()
+
+# --- Rate Limiting ---
+# Keeps bursts (e.g. many /available presses at once) under the Supabase request quota
+# instead of tripping 429s. When a 429 does come back, every query waits out its Retry-After.
+_limiter = AsyncLimiter(DB_RATE_LIMIT_REQUESTS, DB_RATE_LIMIT_PERIOD_SECONDS)
+_retry_after_until = 0.0 # time.monotonic() before which no query should be sent
+
+async def _record_retry_after(response: httpx.Response) -> None:
+    """httpx response hook: remembers the Retry-After of a 429 response."""
+    global _retry_after_until
+    if response.status_code != 429:
+        return
+    try:
+        delay = float(response.headers.get("Retry-After", ""))
+    except ValueError:
+        # Missing or an HTTP date: fall back to the retry backoff alone
+        return
+    _retry_after_until = max(_retry_after_until, time.monotonic() + delay)
+
+# --- Retries ---
+# Rate limiting, gateway errors (PostgREST reports the HTTP status when the body isn't JSON),
+# PostgREST connection/pool errors and serialization/deadlock failures are worth retrying.
+# Anything else (bad request, constraint violation...) fails immediately.
+_RETRYABLE_ERROR_CODES = frozenset({
+    "429", "500", "502", "503", "504", "520",
+    "PGRST000", "PGRST001", "PGRST002", "PGRST003",
+    "40001", "40P01",
+})
+
+def _is_retryable(exc: BaseException) -> bool:
+    """True for transient failures: network errors, rate limits and upstream 5xx."""
+    if isinstance(exc, httpx.TransportError):
+        return True
+    if isinstance(exc, APIError):
+        return str(exc.code) in _RETRYABLE_ERROR_CODES
+    return False
+
+@retry(
+    retry=retry_if_exception(_is_retryable),
+    wait=wait_random_exponential(multiplier=0.2, max=DB_RETRY_MAX_WAIT_SECONDS),
+    stop=stop_after_attempt(DB_RETRY_ATTEMPTS),
+    before_sleep=before_sleep_log(logger, logging.WARNING),
+    reraise=True,
+)
+async def _execute(query):
+    """Executes a PostgREST query, retrying transient failures with jittered exponential backoff."""
+    delay = _retry_after_until - time.monotonic()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    async with _limiter:
+        return await query.execute()
+
+# --- Read Cache ---
+# Single-row lookups (profile, active listing, list message) are read on almost every
+# update but change rarely, so they are served from memory for a short TTL.
+# Keys are (kind, id) tuples, e.g. ("profile", user_id). Writes invalidate their keys.
+_cache: TTLCache = TTLCache(maxsize=CACHE_MAX_SIZE, ttl=CACHE_TTL_SECONDS)
+# The list message ids are read on every list refresh but only written by this bot when it
+# posts a new list, so they are kept much longer and updated in place by save_list_message.
+_list_message_cache: TTLCache = TTLCache(maxsize=8, ttl=LIST_MESSAGE_CACHE_TTL_SECONDS)
+# Profiles are only written through save_profile/delete_profile, which invalidate them, so
+# they can safely be kept longer than the other rows.
+_profile_cache: TTLCache = TTLCache(maxsize=CACHE_MAX_SIZE, ttl=PROFILE_CACHE_TTL_SECONDS)
+
+# Fetches currently running per key, so concurrent misses for the same row share one query
+_in_flight: dict[Hashable, asyncio.Task] = {}
+
+async def cached_fetch(key: Hashable, fetcher: Callable[[], Awaitable[Any]], cache: TTLCache = _cache) -> Any:
+    """Returns the cached value for key, or awaits fetcher() and caches its result.
+
+    Concurrent callers that miss on the same key wait for a single fetcher() call.
+    Exceptions from fetcher() propagate and are not cached. A copy is returned so
+    callers (e.g. the profile wizard) can mutate the result without touching the cache.
+    """
+    if key in cache:
+        return copy.deepcopy(cache[key])
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.get_running_loop().create_task(_fill(key, fetcher, cache))
+        _in_flight[key] = task
+        task.add_done_callback(lambda done: _in_flight.pop(key) if _in_flight.get(key) is done else None)
+    # Shield so one cancelled caller doesn't cancel the fetch for everyone else waiting on it
+    return copy.deepcopy(await asyncio.shield(task))
+
+async def _fill(key: Hashable, fetcher: Callable[[], Awaitable[Any]], cache: TTLCache) -> Any:
+    value = await fetcher()
+    # Don't cache a value that was invalidated by a write while it was being fetched
+    if _in_flight.get(key) is asyncio.current_task():
+        cache[key] = value
+    return value
+
+def invalidate(key: Hashable) -> None:
+    """Drops a single cached entry."""
+    _cache.pop(key, None)
+    _in_flight.pop(key, None)
+
+def invalidate_profile(user_id: int) -> None:
+    """Drops a cached profile, e.g. after it was edited outside save_profile."""
+    _profile_cache.pop(("profile", user_id), None)
+    _in_flight.pop(("profile", user_id), None)
+
+def invalidate_kind(kind: str) -> None:
+    """Drops every cached entry of one kind (used when the row's key is unknown)."""
+    for key in [k for k in list(_cache) if k[0] == kind]:
+        _cache.pop(key, None)
+    for key in [k for k in _in_flight if k[0] == kind]:
+        _in_flight.pop(key, None)
+
+# --- Batch Loader ---
+class BatchLoader:
+    """Coalesces concurrent single-key lookups into one batched query (DataLoader pattern).
+
+    Keys requested within `delay` seconds of each other are fetched together with
+    `batch_fn(keys) -> {key: value}`; keys missing from the result resolve to None.
+    A batch is flushed early once it reaches `max_batch` distinct keys.
+    """
+
+    def __init__(self, batch_fn: Callable[[list], Awaitable[dict]],
+                 delay: float = LOADER_BATCH_DELAY_SECONDS, max_batch: int = LOADER_MAX_BATCH):
+        self._batch_fn = batch_fn
+        self._delay = delay
+        self._max_batch = max_batch
+        self._pending: dict[Hashable, list[asyncio.Future]] = {}
+        self._flush_handle: asyncio.TimerHandle | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    async def load(self, key: Hashable) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(key, []).append(future)
+
+        if len(self._pending) >= self._max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self._delay, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        # Keep a reference so the task isn't garbage collected mid-flight
+        task = asyncio.get_running_loop().create_task(self._dispatch(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
 
-def get_profile(user_id: int) -> dict | None:
+    async def _dispatch(self, pending: dict[Hashable, list[asyncio.Future]]) -> None:
+        try:
+            results = await self._batch_fn(list(pending))
+        except Exception as e:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for key, futures in pending.items():
+            for future in futures:
+                if not future.done():
+                    future.set_result(results.get(key))
+
+async def load_profiles(user_ids: list[int]) -> dict[int, dict]:
+    """Fetches the profiles for many users in one query per batch, keyed by user_id."""
+    profiles = {}
+    for start in range(0, len(user_ids), LOADER_MAX_BATCH):
+        batch = user_ids[start:start + LOADER_MAX_BATCH]
+        response = await _execute(supabase.table(TABLE_PROFILES).select("*").in_("user_id", batch))
+        for profile in response.data:
+            profiles[profile["user_id"]] = profile
+    return profiles
+
+# Profile misses from concurrent handlers are batched the same way as listings
+profile_loader = BatchLoader(load_profiles)
+
+async def get_profile(user_id: int) -> dict | None:
     """Fetches a model's profile from the database."""
     try:
-        response = supabase.table(TABLE_PROFILES).select("*").eq("user_id", user_id).execute()
-        if response.data:
-            return response.data[0]
-        return None
-    except Exception as e:
-        print(f"Error fetching profile for {user_id}: {e}")
+        return await cached_fetch(("profile", user_id), lambda: profile_loader.load(user_id), _profile_cache)
+    except Exception:
+        logger.exception("Error fetching profile for %s", user_id)
         return None
 
-def save_profile(data: dict) -> bool:
+async def save_profile(data: dict) -> bool:
     """Inserts or updates a model's profile."""
     user_id = data.get("user_id")
     if not user_id:
         return False
-    
-    # Add updated_at timestamp
-    data["updated_at"] = datetime.now(timezone.utc).isoformat()
 
     try:
-        # Check if profile exists
-        existing_profile = get_profile(user_id)
-        
-        if existing_profile:
-            # Update existing profile
-            response = supabase.table(TABLE_PROFILES).update(data).eq("user_id", user_id).execute()
-        else:
-            # Insert new profile
-            data["created_at"] = data["updated_at"]
-            response = supabase.table(TABLE_PROFILES).insert(data).execute()
-        
+        # Single round trip: insert or update on the user_id key.
+        # created_at/updated_at are set by column defaults and an update trigger (see migrations/).
+        response = await _execute(supabase.table(TABLE_PROFILES).upsert(data, on_conflict="user_id"))
+        invalidate_profile(user_id)
         return bool(response.data)
-    except Exception as e:
-        print(f"Error saving profile for {user_id}: {e}")
+    except Exception:
+        logger.exception("Error saving profile for %s", user_id)
         return False
 
-def delete_profile(user_id: int) -> bool:
+async def delete_profile(user_id: int) -> bool:
     """Deletes a model's profile and cascade-deletes active listings."""
     try:
         # Deleting from profiles should cascade to active_listings due to foreign key
-        response = supabase.table(TABLE_PROFILES).delete().eq("user_id", user_id).execute()
+        response = await _execute(supabase.table(TABLE_PROFILES).delete().eq("user_id", user_id))
+        invalidate_profile(user_id)
+        invalidate(("active_listing", user_id))
         return bool(response.data)
-    except Exception as e:
-        print(f"Error deleting profile for {user_id}: {e}")
+    except Exception:
+        logger.exception("Error deleting profile for %s", user_id)
         return False
 
-def get_active_listing(user_id: int) -> dict | None:
+async def load_active_listings(user_ids: list[int]) -> dict[int, dict]:
+    """Fetches the active listings for many users in one query per batch, keyed by user_id."""
+    listings = {}
+    for start in range(0, len(user_ids), LOADER_MAX_BATCH):
+        batch = user_ids[start:start + LOADER_MAX_BATCH]
+        response = await _execute(supabase.table(TABLE_ACTIVE_LISTINGS).select("*").in_("user_id", batch))
+        for listing in response.data:
+            listings[listing["user_id"]] = listing
+    return listings
+
+# Concurrent get_active_listing calls (e.g. several admins pressing buttons at once) share one query
+active_listing_loader = BatchLoader(load_active_listings)
+
+async def get_active_listing(user_id: int) -> dict | None:
     """Fetches a model's active listing."""
     try:
-        response = supabase.table(TABLE_ACTIVE_LISTINGS).select("*").eq("user_id", user_id).execute()
-        if response.data:
-            return response.data[0]
-        return None
-    except Exception as e:
-        print(f"Error fetching active listing for {user_id}: {e}")
+        return await cached_fetch(("active_listing", user_id), lambda: active_listing_loader.load(user_id))
+    except Exception:
+        logger.exception("Error fetching active listing for %s", user_id)
         return None
 
-def get_all_active_listings() -> list[dict]:
-    """Fetches all active listings, ordered by last_bump_at for list generation."""
+# Expiry is compared against the database clock: Postgres reads the literal 'now' as the
+# current timestamp, so the filter runs server-side and no client clock skew is involved.
+
+async def get_expired_listings() -> list[dict]:
+    """Fetches the id, owner and message of every listing whose expiry has passed."""
     try:
-        response = supabase.table(TABLE_ACTIVE_LISTINGS).select("*").order("last_bump_at", desc=True).execute()
+        response = await _execute(
+            supabase.table(TABLE_ACTIVE_LISTINGS).select("id,user_id,message_id").lte("expires_at", "now")
+        )
         return response.data
-    except Exception as e:
-        print(f"Error fetching all active listings: {e}")
+    except Exception:
+        logger.exception("Error fetching expired listings")
         return []
 
-def save_active_listing(data: dict) -> bool:
+async def get_all_active_listings_with_profiles(profile_columns: str = PROFILE_LIST_COLUMNS) -> list[dict] | None:
+    """
+    Fetches all unexpired listings with their owner's profile embedded under listing["profiles"],
+    ordered by last_bump_at for list generation. One query via the user_id foreign key, instead
+    of a get_profile call per listing. Returns None if the query fails, so callers can tell it
+    apart from there being no listings.
+    """
+    try:
+        response = await _execute(
+            supabase.table(TABLE_ACTIVE_LISTINGS)
+            .select(f"*, {TABLE_PROFILES}!inner({profile_columns})")
+            .gt("expires_at", "now")
+            .order("last_bump_at", desc=True)
+        )
+        return response.data
+    except Exception:
+        logger.exception("Error fetching all active listings with profiles")
+        return None
+
+async def save_active_listing(data: dict) -> bool:
     """Inserts a new active listing."""
     try:
-        # Set initial last_bump_at
-        if "last_bump_at" not in data:
-            data["last_bump_at"] = datetime.now(timezone.utc).isoformat()
-            
-        response = supabase.table(TABLE_ACTIVE_LISTINGS).insert(data).execute()
+        # last_bump_at defaults to now() in the database when not given
+        response = await _execute(supabase.table(TABLE_ACTIVE_LISTINGS).insert(data))
+        invalidate(("active_listing", data.get("user_id")))
         return bool(response.data)
-    except Exception as e:
-        print(f"Error saving active listing: {e}")
+    except Exception:
+        logger.exception("Error saving active listing")
         return False
 
-def update_active_listing(listing_id: str, data: dict) -> bool:
+async def update_active_listing(listing_id: str, data: dict) -> bool:
     """Updates an existing active listing."""
     try:
-        response = supabase.table(TABLE_ACTIVE_LISTINGS).update(data).eq("id", listing_id).execute()
+        response = await _execute(supabase.table(TABLE_ACTIVE_LISTINGS).update(data).eq("id", listing_id))
+        # Listings are cached by user_id, which isn't known here
+        invalidate_kind("active_listing")
         return bool(response.data)
-    except Exception as e:
-        print(f"Error updating active listing {listing_id}: {e}")
+    except Exception:
+        logger.exception("Error updating active listing %s", listing_id)
         return False
 
-def delete_active_listing(listing_id: str) -> bool:
+async def delete_active_listing(listing_id: str) -> bool:
     """Deletes an active listing."""
     try:
-        response = supabase.table(TABLE_ACTIVE_LISTINGS).delete().eq("id", listing_id).execute()
+        response = await _execute(supabase.table(TABLE_ACTIVE_LISTINGS).delete().eq("id", listing_id))
+        invalidate_kind("active_listing")
         return bool(response.data)
-    except Exception as e:
-        print(f"Error deleting active listing {listing_id}: {e}")
+    except Exception:
+        logger.exception("Error deleting active listing %s", listing_id)
         return False
 
-def get_list_message(list_type: str) -> dict | None:
-    """Fetches the message ID for the pinned or chat list."""
+async def delete_active_listings(listing_ids: list[str]) -> int:
+    """Deletes many active listings in one query per batch. Returns how many rows were removed."""
+    deleted = 0
     try:
-        response = supabase.table(TABLE_LIST_MESSAGES).select("*").eq("type", list_type).execute()
-        if response.data:
-            return response.data[0]
+        for start in range(0, len(listing_ids), LOADER_MAX_BATCH):
+            batch = listing_ids[start:start + LOADER_MAX_BATCH]
+            response = await _execute(supabase.table(TABLE_ACTIVE_LISTINGS).delete().in_("id", batch))
+            deleted += len(response.data)
+    except Exception:
+        logger.exception("Error deleting active listings %s", listing_ids)
+    finally:
+        invalidate_kind("active_listing")
+    return deleted
+
+async def pop_active_listing(user_id: int) -> dict | None:
+    """Deletes a user's active listing and returns the removed row, or None if there was none."""
+    try:
+        # PostgREST returns the deleted rows, so this is the lookup and the delete in one request
+        response = await _execute(supabase.table(TABLE_ACTIVE_LISTINGS).delete().eq("user_id", user_id))
+        invalidate(("active_listing", user_id))
+        return response.data[0] if response.data else None
+    except Exception:
+        logger.exception("Error deleting active listing for user %s", user_id)
         return None
-    except Exception as e:
-        print(f"Error fetching list message for {list_type}: {e}")
+
+async def get_list_message(list_type: str) -> dict | None:
+    """Fetches the message ID for the pinned or chat list."""
+    async def fetch() -> dict | None:
+        response = await _execute(supabase.table(TABLE_LIST_MESSAGES).select("*").eq("type", list_type).limit(1).maybe_single())
+        # maybe_single() yields no response at all when the row doesn't exist
+        return response.data if response else None
+
+    try:
+        return await cached_fetch(("list_message", list_type), fetch, _list_message_cache)
+    except Exception:
+        logger.exception("Error fetching list message for %s", list_type)
         return None
 
-def save_list_message(list_type: str, message_id: int) -> bool:
+async def save_list_message(list_type: str, message_id: int) -> bool:
     """Inserts or updates the message ID for the pinned or chat list."""
+    # updated_at is set by the database (column default on insert, trigger on update)
     data = {
         "type": list_type,
         "message_id": message_id,
-        "updated_at": datetime.now(timezone.utc).isoformat()
     }
     try:
         # Upsert logic: Supabase handles this with on_conflict
-        response = supabase.table(TABLE_LIST_MESSAGES).upsert(data, on_conflict="type").execute()
+        response = await _execute(supabase.table(TABLE_LIST_MESSAGES).upsert(data, on_conflict="type"))
+        # Write through so the next refresh doesn't have to read the row back
+        _in_flight.pop(("list_message", list_type), None)
+        if response.data:
+            _list_message_cache[("list_message", list_type)] = response.data[0]
+        else:
+            _list_message_cache.pop(("list_message", list_type), None)
         return bool(response.data)
-    except Exception as e:
-        print(f"Error saving list message for {list_type}: {e}")
+    except Exception:
+        logger.exception("Error saving list message for %s", list_type)
         return False
 
 # --- Schema Creation (Manual for now, but good to have a function) ---
 # NOTE: In a real-world scenario, the schema would be created via Supabase migration.
 # For this task, we assume the tables exist or the user will create them.
-# The SQL is in the requirements document.
+# The SQL lives in migrations/: 000_baseline.sql creates the tables, and the numbered
+# files after it should be applied in order from the Supabase SQL editor.
 # The required tables are: profiles, active_listings, list_messages
@@ -1,12 +1,19 @@
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto, InputMediaVideo
+from telegram import Update, Message, InlineKeyboardButton, InlineKeyboardMarkup, InputMediaPhoto, InputMediaVideo
 from telegram.ext import ContextTypes, ConversationHandler
 from datetime import datetime, timedelta, timezone
 from typing import Dict, Any, List
+from enum import IntFlag
+from functools import lru_cache
+import asyncio
 import json
+from collections import deque
+import logging
 import db
+from handlers.member import member_available_command
 from utils.constants import (
  
-    APPROVED_ADMIN_IDS, GROUP_CHAT_ID, LISTING_DURATIONS, COOLDOWN_MINUTES,
+    APPROVED_ADMIN_IDS, GROUP_CHAT_ID, GROUP_CHAT_ID_INT, LISTING_DURATIONS, COOLDOWN_MINUTES,
+    MAX_LISTING_PHOTOS, MAX_LISTING_VIDEOS,
     STATE_NAME, STATE_SERVICES, STATE_INPERSON, STATE_FACETIME, STATE_CUSTOM,
     STATE_OTHER, STATE_ABOUT, STATE_CONTACT_METHOD, STATE_CONTACT_INFO,
     STATE_SOCIAL_LINKS, STATE_RATES, STATE_DISCLAIMER, STATE_ALLOW_COMMENTS,
@@ -17,18 +24,133 @@ from utils.constants import (
 
 from utils.formatting import generate_listing_message
 
+logger = logging.getLogger(__name__)
+
+# --- Static Keyboards ---
+# Built once at import; InlineKeyboardMarkup is immutable, so every handler can reuse them.
+
+_MENU_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Create/Edit Profile", callback_data="profile_edit")],
+    [InlineKeyboardButton("Delete Profile", callback_data="profile_delete")],
+    [InlineKeyboardButton("Go Available Now (Group)", callback_data="go_available")],
+    [InlineKeyboardButton("Bump Listing (Group)", callback_data="bump_listing")],
+])
+
+_DELETE_CONFIRM_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("YES, Delete My Profile", callback_data="profile_delete_confirm")],
+    [InlineKeyboardButton("Cancel", callback_data="profile_delete_cancel")],
+])
+
+class Service(IntFlag):
+    """One bit per selectable service; bit order is also the wizard's step order."""
+    INPERSON = 1
+    FACETIME = 2
+    CUSTOM = 4
+    OTHER = 8
+
+# (label, callback_data, flag) for each service, in display order
+_SERVICE_OPTIONS = (
+    ("In-Person", "service_In-Person", Service.INPERSON),
+    ("Facetime Shows", "service_Facetime Shows", Service.FACETIME),
+    ("Custom Content", "service_Custom Content", Service.CUSTOM),
+    ("Other", "service_Other", Service.OTHER),
+)
+
+# Button presses map straight from callback_data to their bit
+_SERVICE_FROM_CB = {callback_data: flag for _, callback_data, flag in _SERVICE_OPTIONS}
+
+def _render_services_kb(selected: int) -> InlineKeyboardMarkup:
+    """Builds the 2x2 services grid, ticking the services set in the `selected` mask."""
+    buttons = [
+        InlineKeyboardButton("✅ " + label if selected & flag else label, callback_data=callback_data)
+        for label, callback_data, flag in _SERVICE_OPTIONS
+    ]
+    done_label = "✅ Done Selecting Services" if selected else "Done Selecting Services"
+    return InlineKeyboardMarkup([
+        buttons[0:2],
+        buttons[2:4],
+        [InlineKeyboardButton(done_label, callback_data="service_done")],
+    ])
+
+_SERVICES_KB = _render_services_kb(0)
+
+_INPERSON_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Incall Only", callback_data="inperson_Incall Only")],
+    [InlineKeyboardButton("Outcall Only", callback_data="inperson_Outcall Only")],
+    [InlineKeyboardButton("Both", callback_data="inperson_Both")],
+])
+
+_CONTACT_METHOD_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("Text/Call", callback_data="contact_text_call")],
+    [InlineKeyboardButton("Email", callback_data="contact_email")],
+    [InlineKeyboardButton("Telegram", callback_data="contact_telegram")],
+])
+
+_COMMENTS_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("YES 💬", callback_data="comments_true")],
+    [InlineKeyboardButton("NO 🚫", callback_data="comments_false")],
+])
+
+_PREVIEW_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton("✅ CONFIRM & SAVE", callback_data="profile_save")],
+    [InlineKeyboardButton("✏️ Edit (Restart Wizard)", callback_data="profile_edit_restart")],
+    [InlineKeyboardButton("❌ Cancel", callback_data="profile_cancel")],
+])
+
+_DURATION_KB = InlineKeyboardMarkup([
+    [InlineKeyboardButton(f"{hours} hours", callback_data=f"duration_{key}") for key, hours in LISTING_DURATIONS.items()]
+])
+
+# --- Wizard Routing ---
+
+_ABOUT_STEP = (STATE_ABOUT, "Step 7/15: Please provide a short bio or description of yourself (e.g., '5'6\" curvy, love chats!'). This will appear under an 'About' section.", None)
+
+# (state, prompt, reply_markup) opening each service-specific step, keyed by its Service bit
+_SERVICE_STEPS = {
+    Service.INPERSON: (STATE_INPERSON, "Step 3/15: You selected In-Person. Do you offer Incall, Outcall, or Both?", _INPERSON_KB),
+    Service.FACETIME: (STATE_FACETIME, "Step 4/15: You selected Facetime Shows. Which platforms/apps do you use? (e.g., Zoom, FaceTime)", None),
+    Service.CUSTOM: (STATE_CUSTOM, "Step 5/15: You selected Custom Content. How do you accept payment for content? (e.g., CashApp, PayPal)", None),
+    Service.OTHER: (STATE_OTHER, "Step 6/15: You selected Other. Please briefly describe the other service.", None),
+}
+
+def _next_after(stage: int, mask: int) -> tuple:
+    """Returns the (state, prompt, reply_markup) of the first selected service step after `stage` (0 = none done yet)."""
+    remaining = mask & ~((1 << stage.bit_length()) - 1)
+    return _SERVICE_STEPS.get(remaining & -remaining, _ABOUT_STEP)
+
+# --- Durations ---
+# Resolved once so the posting path only does a lookup and an add
+
+_DURATION_DELTAS = {key: timedelta(hours=hours) for key, hours in LISTING_DURATIONS.items()}
+_PREVIEW_DELTA = timedelta(hours=2)
+_COOLDOWN_DELTA = timedelta(minutes=COOLDOWN_MINUTES)
+
 # --- Helper Functions ---
 
+# Checked on nearly every update, so use a set for O(1) lookups
+_ADMIN_IDS = frozenset(APPROVED_ADMIN_IDS)
+
 def is_admin(user_id: int) -> bool:
     """Checks if the user is an approved admin."""
-    return user_id in APPROVED_ADMIN_IDS
+    return user_id in _ADMIN_IDS
 
 async def check_admin(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
     """Decorator-like function to check admin status and send a message if not."""
-    if not is_admin(update.effective_user.id):
-        await update.message.reply_text("This bot is for authorized users only.")
-        return False
-    return True
+    if is_admin(update.effective_user.id):
+        return True
+    # Only explain in private chats; in the group, non-admin traffic gets no reply
+    if update.effective_chat.type == "private":
+        await update.effective_message.reply_text("This bot is for authorized users only.")
+    return False
+
+async def _reply(update: Update, text: str, **kwargs) -> None:
+    """Answers a button press by editing its message, or a command with a new reply."""
+    query = update.callback_query
+    if query:
+        await query.answer()
+        await query.edit_message_text(text, **kwargs)
+    else:
+        await update.message.reply_text(text, **kwargs)
 
 async def update_available_lists_now(context: ContextTypes.DEFAULT_TYPE):
     """Triggers an immediate update of the Pinned List."""
@@ -43,12 +165,32 @@ async def update_available_lists_now(context: ContextTypes.DEFAULT_TYPE):
     
     # For simplicity in this implementation, we'll just log and rely on the 60s scheduler job.
     # In a production environment, we would move the list update logic to a shared utility.
-    print("Triggering list update via scheduler job...")
+    logger.debug("Triggering list update via scheduler job...")
     # The scheduler will run the job in the background, so we don't need to wait.
     # The `update_available_lists` function in scheduler.py needs to be callable
     # with just the bot instance.
     # await update_available_lists(context.bot) # This would be the ideal call
 
+def _build_media_group(photos: List[str], videos: List[str], caption: str | None = None, parse_mode: str | None = None) -> List[Any]:
+    """Builds a photos-then-videos album with `caption` on its first item."""
+    # Telegram limit is 10 media items, so trim the ids before building anything
+    photos = tuple(photos[:10])
+    videos = tuple(videos[:10 - len(photos)])
+    if photos:
+        head = InputMediaPhoto(photos[0], caption=caption, parse_mode=parse_mode)
+    elif videos:
+        head = InputMediaVideo(videos[0], caption=caption, parse_mode=parse_mode)
+    else:
+        return []
+    return [head, *_media_tail(photos, videos)]
+
+@lru_cache(maxsize=128)
+def _media_tail(photos: tuple, videos: tuple) -> tuple:
+    """Builds the caption-less album items after the first; InputMedia objects are immutable, so re-posts reuse them."""
+    if photos:
+        return (*(InputMediaPhoto(file_id) for file_id in photos[1:]), *(InputMediaVideo(file_id) for file_id in videos))
+    return tuple(InputMediaVideo(file_id) for file_id in videos[1:])
+
 # --- Command Handlers ---
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -59,17 +201,9 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     if update.effective_chat.type != "private":
         return
 
-    keyboard = [
-        [InlineKeyboardButton("Create/Edit Profile", callback_data="profile_edit")],
-        [InlineKeyboardButton("Delete Profile", callback_data="profile_delete")],
-        [InlineKeyboardButton("Go Available Now (Group)", callback_data="go_available")],
-        [InlineKeyboardButton("Bump Listing (Group)", callback_data="bump_listing")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
     await update.message.reply_text(
         "Welcome to the 'Available Now' Bot Admin Menu. What would you like to do?",
-        reply_markup=reply_markup
+        reply_markup=_MENU_KB
     )
 
 async def delete_profile_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -81,15 +215,9 @@ async def delete_profile_confirm(update: Update, context: ContextTypes.DEFAULT_T
         await query.edit_message_text("Unauthorized access.")
         return
 
-    keyboard = [
-        [InlineKeyboardButton("YES, Delete My Profile", callback_data="profile_delete_confirm")],
-        [InlineKeyboardButton("Cancel", callback_data="profile_delete_cancel")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-
     await query.edit_message_text(
         "⚠️ *Are you sure you want to delete your profile?* This cannot be undone and will remove any active listing you have.",
-        reply_markup=reply_markup,
+        reply_markup=_DELETE_CONFIRM_KB,
         parse_mode="Markdown"
     )
 
@@ -100,7 +228,7 @@ async def delete_profile_execute(update: Update, context: ContextTypes.DEFAULT_T
 
     user_id = query.from_user.id
     
-    if db.delete_profile(user_id):
+    if await db.delete_profile(user_id):
         await query.edit_message_text("✅ Your profile has been deleted. You will need to run /createprofile again to use the bot.")
     else:
         await query.edit_message_text("❌ Failed to delete your profile. Please try again or contact support.")
@@ -109,20 +237,16 @@ async def delete_profile_execute(update: Update, context: ContextTypes.DEFAULT_T
 
 async def create_profile_start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Starts the profile creation wizard."""
-    if update.callback_query:
-        query = update.callback_query
-        await query.answer()
-        await query.edit_message_text("Starting the Profile Setup Wizard...")
-    elif update.message:
-        await update.message.reply_text("Starting the Profile Setup Wizard...")
-    
-    if not is_admin(update.effective_user.id):
+    if not await check_admin(update, context):
         return ConversationHandler.END
 
+    await _reply(update, "Starting the Profile Setup Wizard...")
+
     # Initialize user data for the wizard
-    context.user_data["profile_data"] = db.get_profile(update.effective_user.id) or {"user_id": update.effective_user.id}
-    context.user_data["media_photos"] = context.user_data["profile_data"].get("photo_file_ids", [])
-    context.user_data["media_videos"] = context.user_data["profile_data"].get("video_file_ids", [])
+    context.user_data["profile_data"] = await db.get_profile(update.effective_user.id) or {"user_id": update.effective_user.id}
+    # Bounded buffers; a full one is detected by comparing len to maxlen
+    context.user_data["media_photos"] = deque(context.user_data["profile_data"].get("photo_file_ids") or (), maxlen=MAX_LISTING_PHOTOS)
+    context.user_data["media_videos"] = deque(context.user_data["profile_data"].get("video_file_ids") or (), maxlen=MAX_LISTING_VIDEOS)
 
     await update.effective_chat.send_message("Step 1/15: What name or catchy line do you want to display? (This will be the bold title of your listing)")
     return STATE_NAME
@@ -133,23 +257,10 @@ async def profile_name(update:
     """Collects the model's display name/headline."""
     context.user_data["profile_data"]["name_subject"] = update.message.text
     
-    keyboard = [
-        [
-            InlineKeyboardButton("In-Person", callback_data="service_In-Person"),
-            InlineKeyboardButton("Facetime Shows", callback_data="service_Facetime Shows")
-        ],
-        [
-            InlineKeyboardButton("Custom Content", callback_data="service_Custom Content"),
-            InlineKeyboardButton("Other", callback_data="service_Other")
-        ],
-        [InlineKeyboardButton("Done Selecting Services", callback_data="service_done")]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
-    context.user_data["selected_services"] = []
+    context.user_data["selected_services"] = 0
     await update.message.reply_text(
         "Step 2/15: What services do you offer? (Tap one or more, then tap 'Done')",
-        reply_markup=reply_markup
+        reply_markup=_SERVICES_KB
     )
     return STATE_SERVICES
 
@@ -158,62 +269,27 @@ async def profile_services_callback(update: Update, context: ContextTypes.DEFAUL
     query = update.callback_query
     await query.answer()
     
-    service = query.data.replace("service_", "")
-    
-    if service == "done":
+    if query.data == "service_done":
         if not context.user_data["selected_services"]:
             await query.edit_message_text("Please select at least one service before continuing.")
             return STATE_SERVICES
         
-        context.user_data["profile_data"]["offer_types"] = json.dumps(context.user_data["selected_services"])
+        # Stored in display order so listings show services consistently
+        context.user_data["profile_data"]["offer_types"] = json.dumps(
+            [label for label, _, flag in _SERVICE_OPTIONS if context.user_data["selected_services"] & flag]
+        )
         
-        # Determine the next state based on selected services
-        services = context.user_data["selected_services"]
-        if "In-Person" in services:
-            keyboard = [
-                [InlineKeyboardButton("Incall Only", callback_data="inperson_Incall Only")],
-                [InlineKeyboardButton("Outcall Only", callback_data="inperson_Outcall Only")],
-                [InlineKeyboardButton("Both", callback_data="inperson_Both")],
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text(
-                "Step 3/15: You selected In-Person. Do you offer Incall, Outcall, or Both?",
-                reply_markup=reply_markup
-            )
-            return STATE_INPERSON
-        elif "Facetime Shows" in services:
-            await query.edit_message_text("Step 4/15: You selected Facetime Shows. Which platforms/apps do you use? (e.g., Zoom, FaceTime)")
-            return STATE_FACETIME
-        elif "Custom Content" in services:
-            await query.edit_message_text("Step 5/15: You selected Custom Content. How do you accept payment for content? (e.g., CashApp, PayPal)")
-            return STATE_CUSTOM
-        elif "Other" in services:
-            await query.edit_message_text("Step 6/15: You selected Other. Please briefly describe the other service.")
-            return STATE_OTHER
-        else:
-            # Skip all service-specific steps
-            await query.edit_message_text("Step 7/15: Please provide a short bio or description of yourself (e.g., '5'6\" curvy, love chats!'). This will appear under an 'About' section.")
-            return STATE_ABOUT
-            
+        state, prompt, markup = _next_after(0, context.user_data["selected_services"])
+        await query.edit_message_text(prompt, reply_markup=markup)
+        return state
+
     else:
-        if service in context.user_data["selected_services"]:
-            context.user_data["selected_services"].remove(service)
-        else:
-            context.user_data["selected_services"].append(service)
+        context.user_data["selected_services"] ^= _SERVICE_FROM_CB.get(query.data, 0)
         
         # Re-render the keyboard with updated selection status
-        keyboard = [
-            [InlineKeyboardButton(f"{'✅ ' if 'In-Person' in context.user_data['selected_services'] else ''}In-Person", callback_data="service_In-Person"),
-             InlineKeyboardButton(f"{'✅ ' if 'Facetime Shows' in context.user_data['selected_services'] else ''}Facetime Shows", callback_data="service_Facetime Shows")],
-            [InlineKeyboardButton(f"{'✅ ' if 'Custom Content' in context.user_data['selected_services'] else ''}Custom Content", callback_data="service_Custom Content"),
-             InlineKeyboardButton(f"{'✅ ' if 'Other' in context.user_data['selected_services'] else ''}Other", callback_data="service_Other")],
-            [InlineKeyboardButton("✅ Done Selecting Services", callback_data="service_done")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
         await query.edit_message_text(
             "Step 2/15: What services do you offer? (Tap one or more, then tap 'Done')",
-            reply_markup=reply_markup
+            reply_markup=_render_services_kb(context.user_data["selected_services"])
         )
         return STATE_SERVICES
 
@@ -222,28 +298,18 @@ async def profile_inperson_type(update: Update, context: ContextTypes.DEFAULT_TY
     query = update.callback_query
     await query.answer()
     
-    context.user_data["profile_data"]["inperson_incall_outcall"] = query.data.replace("inperson_", "")
+    context.user_data["profile_data"]["inperson_incall_outcall"] = query.data.removeprefix("inperson_")
     
     await query.edit_message_text("Step 3/15: Please provide a short Location description (e.g., neighborhood or city area).")
-  return STATE_INPERSON_LOCATION
+    return STATE_INPERSON_LOCATION
 
 async def profile_inperson_location(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Collects In-Person location."""
     context.user_data["profile_data"]["inperson_location"] = update.message.text
     
-    services = context.user_data["selected_services"]
-    if "Facetime Shows" in services:
-        await update.message.reply_text("Step 4/15: You selected Facetime Shows. Which platforms/apps do you use? (e.g., Zoom, FaceTime)")
-        return STATE_FACETIME
-    elif "Custom Content" in services:
-        await update.message.reply_text("Step 5/15: You selected Custom Content. How do you accept payment for content? (e.g., CashApp, PayPal)")
-        return STATE_CUSTOM
-    elif "Other" in services:
-        await update.message.reply_text("Step 6/15: You selected Other. Please briefly describe the other service.")
-        return STATE_OTHER
-    else:
-        await update.message.reply_text("Step 7/15: Please provide a short bio or description of yourself (e.g., '5'6\" curvy, love chats!'). This will appear under an 'About' section.")
-        return STATE_ABOUT
+    state, prompt, markup = _next_after(Service.INPERSON, context.user_data["selected_services"])
+    await update.message.reply_text(prompt, reply_markup=markup)
+    return state
 
 async def profile_facetime_platforms(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Collects Facetime platforms."""
@@ -255,16 +321,9 @@ async def profile_facetime_payment(update: Update, context: ContextTypes.DEFAULT
     """Collects Facetime payment method."""
     context.user_data["profile_data"]["facetime_payment"] = update.message.text
     
-    services = context.user_data["selected_services"]
-    if "Custom Content" in services:
-        await update.message.reply_text("Step 5/15: You selected Custom Content. How do you accept payment for content? (e.g., CashApp, PayPal)")
-        return STATE_CUSTOM
-    elif "Other" in services:
-        await update.message.reply_text("Step 6/15: You selected Other. Please briefly describe the other service.")
-        return STATE_OTHER
-    else:
-        await update.message.reply_text("Step 7/15: Please provide a short bio or description of yourself (e.g., '5'6\" curvy, love chats!'). This will appear under an 'About' section.")
-        return STATE_ABOUT
+    state, prompt, markup = _next_after(Service.FACETIME, context.user_data["selected_services"])
+    await update.message.reply_text(prompt, reply_markup=markup)
+    return state
 
 async def profile_custom_payment(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Collects Custom Content payment method."""
@@ -276,13 +335,9 @@ async def profile_custom_delivery(update: Update, context: ContextTypes.DEFAULT_
     """Collects Custom Content delivery method."""
     context.user_data["profile_data"]["custom_delivery"] = update.message.text
     
-    services = context.user_data["selected_services"]
-    if "Other" in services:
-        await update.message.reply_text("Step 6/15: You selected Other. Please briefly describe the other service.")
-        return STATE_OTHER
-    else:
-        await update.message.reply_text("Step 7/15: Please provide a short bio or description of yourself (e.g., '5'6\" curvy, love chats!'). This will appear under an 'About' section.")
-        return STATE_ABOUT
+    state, prompt, markup = _next_after(Service.CUSTOM, context.user_data["selected_services"])
+    await update.message.reply_text(prompt, reply_markup=markup)
+    return state
 
 async def profile_other_service(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Collects Other service description."""
@@ -294,16 +349,9 @@ async def profile_about(update: Update, context: ContextTypes.DEFAULT_TYPE) -> i
     """Collects the 'About' bio."""
     context.user_data["profile_data"]["about"] = update.message.text
     
-    keyboard = [
-        [InlineKeyboardButton("Text/Call", callback_data="contact_text_call")],
-        [InlineKeyboardButton("Email", callback_data="contact_email")],
-        [InlineKeyboardButton("Telegram", callback_data="contact_telegram")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
     await update.message.reply_text(
         "Step 8/15: What is your preferred contact method?",
-        reply_markup=reply_markup
+        reply_markup=_CONTACT_METHOD_KB
     )
     return STATE_CONTACT_METHOD
 
@@ -312,7 +360,7 @@ async def profile_contact_method(update: Update, context: ContextTypes.DEFAULT_T
     query = update.callback_query
     await query.answer()
     
-    method = query.data.replace("contact_", "")
+    method = query.data.removeprefix("contact_")
     context.user_data["profile_data"]["contact_method"] = method
     
     if method == "text_call":
@@ -373,15 +421,9 @@ async def profile_disclaimer(update: Update, context: ContextTypes.DEFAULT_TYPE)
     if disclaimer.lower() != "skip":
         context.user_data["profile_data"]["disclaimer"] = disclaimer
     
-    keyboard = [
-        [InlineKeyboardButton("YES 💬", callback_data="comments_true")],
-        [InlineKeyboardButton("NO 🚫", callback_data="comments_false")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
     await update.message.reply_text(
         "Step 13/15: Do you want to allow members to comment (threaded replies) under your availability posts?",
-        reply_markup=reply_markup
+        reply_markup=_COMMENTS_KB
     )
     return STATE_ALLOW_COMMENTS
 
@@ -395,52 +437,56 @@ async def profile_allow_comments(update: Update, context: ContextTypes.DEFAULT_T
     await query.edit_message_text("Step 14/15: Please send up to 10 photos that will be used in your listing (as an album carousel). Send them one by one. When finished, type /done.")
     return STATE_PHOTOS
 
+async def profile_photos_done(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handles /done in the photos step."""
+    if not context.user_data["media_photos"]:
+        await update.message.reply_text("Please send at least one photo or video, or confirm you want to skip media by typing /skip_media.")
+        return STATE_PHOTOS
+    
+    context.user_data["profile_data"]["photo_file_ids"] = list(context.user_data["media_photos"])
+    
+    await update.message.reply_text("Step 15/15: Please send up to 4 short video clips. Send them one by one. When finished, type /done.")
+    return STATE_VIDEOS
+
 async def profile_photos(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Collects photos and saves their file_ids."""
-    if update.message.text and update.message.text.lower() == "/done":
-        if not context.user_data["media_photos"]:
-            await update.message.reply_text("Please send at least one photo or video, or confirm you want to skip media by typing /skip_media.")
-            return STATE_PHOTOS
-        
-        context.user_data["profile_data"]["photo_file_ids"] = context.user_data["media_photos"]
-        
-        await update.message.reply_text("Step 15/15: Please send up to 4 short video clips. Send them one by one. When finished, type /done.")
-        return STATE_VIDEOS
-    
+    photos = context.user_data["media_photos"]
     if update.message.photo:
         file_id = update.message.photo[-1].file_id # Get the largest photo
-        if len(context.user_data["media_photos"]) < 10:
-            context.user_data["media_photos"].append(file_id)
-            await update.message.reply_text(f"Photo received. Total photos: {len(context.user_data['media_photos'])}/10. Send another or type /done.")
+        if len(photos) != photos.maxlen:
+            photos.append(file_id)
+            await update.message.reply_text(f"Photo received. Total photos: {len(photos)}/{photos.maxlen}. Send another or type /done.")
         else:
-            await update.message.reply_text("Maximum of 10 photos reached. Please type /done to continue.")
+            await update.message.reply_text(f"Maximum of {photos.maxlen} photos reached. Please type /done to continue.")
     elif update.message.document and update.message.document.mime_type.startswith('image'):
         file_id = update.message.document.file_id
-        if len(context.user_data["media_photos"]) < 10:
-            context.user_data["media_photos"].append(file_id)
-            await update.message.reply_text(f"Image file received. Total photos: {len(context.user_data['media_photos'])}/10. Send another or type /done.")
+        if len(photos) != photos.maxlen:
+            photos.append(file_id)
+            await update.message.reply_text(f"Image file received. Total photos: {len(photos)}/{photos.maxlen}. Send another or type /done.")
         else:
-            await update.message.reply_text("Maximum of 10 photos reached. Please type /done to continue.")
+            await update.message.reply_text(f"Maximum of {photos.maxlen} photos reached. Please type /done to continue.")
     else:
         await update.message.reply_text("Please send a photo or type /done when finished.")
         
     return STATE_PHOTOS
 
+async def profile_videos_done(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Handles /done in the videos step."""
+    context.user_data["profile_data"]["video_file_ids"] = list(context.user_data["media_videos"])
+    
+    # Proceed to preview
+    return await profile_preview(update, context)
+
 async def profile_videos(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Collects videos and saves their file_ids."""
-    if update.message.text and update.message.text.lower() == "/done":
-        context.user_data["profile_data"]["video_file_ids"] = context.user_data["media_videos"]
-        
-        # Proceed to preview
-        return await profile_preview(update, context)
-    
+    videos = context.user_data["media_videos"]
     if update.message.video:
         file_id = update.message.video.file_id
-        if len(context.user_data["media_videos"]) < 4:
-            context.user_data["media_videos"].append(file_id)
-            await update.message.reply_text(f"Video received. Total videos: {len(context.user_data['media_videos'])}/4. Send another or type /done.")
+        if len(videos) != videos.maxlen:
+            videos.append(file_id)
+            await update.message.reply_text(f"Video received. Total videos: {len(videos)}/{videos.maxlen}. Send another or type /done.")
         else:
-            await update.message.reply_text("Maximum of 4 videos reached. Please type /done to continue.")
+            await update.message.reply_text(f"Maximum of {videos.maxlen} videos reached. Please type /done to continue.")
     else:
         await update.message.reply_text("Please send a video or type /done when finished.")
         
@@ -450,31 +496,22 @@ async def profile_preview(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     """Shows the final preview and asks for confirmation."""
     
     # Create a dummy listing for preview purposes
+    now = datetime.now(timezone.utc)
     dummy_listing = {
-        "expires_at": (datetime.now(timezone.utc) + timedelta(hours=2)).isoformat(),
+        "expires_at": (now + _PREVIEW_DELTA).isoformat(),
         "message_id": 0 # Not a real message ID
     }
     
     # Generate the message content
-    message_text = generate_listing_message(context.user_data["profile_data"], dummy_listing)
+    message_text = generate_listing_message(context.user_data["profile_data"], dummy_listing, now)
     
     # Prepare media group for preview
-    media_group = []
     photos = context.user_data["profile_data"].get("photo_file_ids", [])
     videos = context.user_data["profile_data"].get("video_file_ids", [])
-    
-    if photos:
-        media_group.append(InputMediaPhoto(photos[0], caption="Preview Photo (1 of 10)"))
-        for file_id in photos[1:]:
-            media_group.append(InputMediaPhoto(file_id))
-    
-    if videos:
-        if not media_group:
-            media_group.append(InputMediaVideo(videos[0], caption="Preview Video (1 of 4)"))
-        else:
-            media_group.append(InputMediaVideo(videos[0]))
-        for file_id in videos[1:]:
-            media_group.append(InputMediaVideo(file_id))
+    media_group = _build_media_group(
+        photos, videos,
+        caption="Preview Photo (1 of 10)" if photos else "Preview Video (1 of 4)"
+    )
 
     # Send media group first, then the text preview
     if media_group:
@@ -485,16 +522,9 @@ async def profile_preview(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         parse_mode="MarkdownV2"
     )
     
-    keyboard = [
-        [InlineKeyboardButton("✅ CONFIRM & SAVE", callback_data="profile_save")],
-        [InlineKeyboardButton("✏️ Edit (Restart Wizard)", callback_data="profile_edit_restart")],
-        [InlineKeyboardButton("❌ Cancel", callback_data="profile_cancel")],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    
     await update.effective_chat.send_message(
         "Review your profile. What would you like to do?",
-        reply_markup=reply_markup
+        reply_markup=_PREVIEW_KB
     )
     
     return STATE_PREVIEW
@@ -509,7 +539,7 @@ async def profile_save(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     # Clean up temporary keys
     profile_data.pop("selected_services", None)
     
-    if db.save_profile(profile_data):
+    if await db.save_profile(profile_data):
         await query.edit_message_text("✅ Profile saved! You can now use /available in the group to go live.")
     else:
         await query.edit_message_text("❌ Failed to save profile. Please try again or contact support.")
@@ -518,18 +548,18 @@ async def profile_save(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 
 async def profile_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancels the profile creation wizard."""
-    if update.callback_query:
-        query = update.callback_query
-        await query.answer()
-        await query.edit_message_text(
-            "Profile setup cancelled. Your profile remains unchanged."
-        )
-    else:
-        await update.message.reply_text(
-            "Profile setup cancelled. Your profile remains unchanged."
-        )
+    await _reply(update, "Profile setup cancelled. Your profile remains unchanged.")
     return ConversationHandler.END
 
+async def profile_preview_action(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Routes the preview buttons: profile_save, profile_edit_restart or profile_cancel."""
+    action = context.match.group(1)
+    if action == "save":
+        return await profile_save(update, context)
+    if action == "edit_restart":
+        return await create_profile_start(update, context)
+    return await profile_cancel(update, context)
+
 async def profile_fallback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Fallback for unexpected messages during the wizard."""
     await update.message.reply_text("I didn't understand that. Please follow the instructions for the current step or type /cancel to exit the wizard.")
@@ -537,6 +567,16 @@ async def profile_fallback(update: Update, context: ContextTypes.DEFAULT_TYPE) -
 
 # --- Group Chat Commands ---
 
+async def available_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Single entry point for /available in groups.
+    Approved admins post a listing; everyone else refreshes the chat list.
+    """
+    if is_admin(update.effective_user.id):
+        await admin_available_command(update, context)
+    else:
+        await member_available_command(update, context)
+
 async def admin_available_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """
     Handles the /available command from an admin in the group chat.
@@ -545,42 +585,64 @@ async def admin_available_command(update: Update, context: ContextTypes.DEFAULT_
     if not await check_admin(update, context):
         return
     
-    if str(update.effective_chat.id) != GROUP_CHAT_ID:
+    if update.effective_chat.id != GROUP_CHAT_ID_INT:
         await update.message.reply_text("Please use this command in the designated group chat.")
         return
 
     user_id = update.effective_user.id
-    profile = db.get_profile(user_id)
+    # Independent lookups, so fetch the profile and any existing listing together
+    profile, existing_listing = await asyncio.gather(
+        db.get_profile(user_id),
+        db.get_active_listing(user_id),
+    )
     
     if not profile:
         await update.message.reply_text("You need to create a profile first. Please start a private chat with me and use /start to begin.")
         return
 
     # Check for existing active listing
-    existing_listing = db.get_active_listing(user_id)
+    prompt = "How long do you want to be available?"
     if existing_listing:
-        # Delete old message and record
-        try:
-            await context.bot.delete_message(
-                chat_id=GROUP_CHAT_ID,
-                message_id=existing_listing["message_id"]
-            )
-        except Exception as e:
-            print(f"Error deleting old listing message {existing_listing['message_id']}: {e}")
-        
-        db.delete_active_listing(existing_listing["id"])
-        await update.message.reply_text("Your previous listing has been replaced with a new one.")
+        prompt = "Your previous listing will be replaced with a new one.\n\n" + prompt
 
-    # Prompt for duration
-    keyboard = [
-        [InlineKeyboardButton(f"{h} hours", callback_data=f"duration_{h}") for h in LISTING_DURATIONS.keys()]
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+    # Prompt for duration first; the old listing is removed in the background
+    await update.message.reply_text(prompt, reply_markup=_DURATION_KB)
+
+    if existing_listing:
+        # post_listing_callback waits on this before inserting the new listing
+        context.user_data["listing_cleanup"] = context.application.create_task(
+            _cleanup_old_listing(context.bot, user_id), update=update
+        )
+
+async def _cleanup_old_listing(bot, user_id: int) -> None:
+    """Deletes a replaced listing's record and group message."""
+    listing = await db.pop_active_listing(user_id)
+    if not listing:
+        return
+
+    try:
+        await bot.delete_message(chat_id=GROUP_CHAT_ID, message_id=listing["message_id"])
+    except Exception as e:
+        logger.warning("Error deleting old listing message %s: %s", listing["message_id"], e)
+
+async def _send_listing(bot, text: str, photos: List[str], videos: List[str]) -> List[Message]:
+    """Posts a listing to the group and returns its messages; the first carries the listing text."""
+    # Telegram only allows one caption for a media group, so the listing text
+    # goes on the first item and the album is the listing itself.
+    # The file ids are already on Telegram's servers, so nothing is re-uploaded.
+    media_items = _build_media_group(photos, videos, caption=text, parse_mode="MarkdownV2")
     
-    await update.message.reply_text(
-        "How long do you want to be available?",
-        reply_markup=reply_markup
-    )
+    if media_items:
+        try:
+            return list(await bot.send_media_group(chat_id=GROUP_CHAT_ID, media=media_items))
+        except Exception:
+            logger.exception("Error sending media group. Falling back to text message.")
+    
+    return [await bot.send_message(chat_id=GROUP_CHAT_ID, text=text, parse_mode="MarkdownV2")]
+
+def _has_media(message: Message) -> bool:
+    """Whether a sent listing carries its text as a media caption (so it is edited with edit_message_caption)."""
+    return bool(message.photo or message.video)
 
 async def post_listing_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Posts the availability listing after duration selection."""
@@ -588,115 +650,91 @@ async def post_listing_callback(update: Update, context: ContextTypes.DEFAULT_TY
     await query.answer()
     
     user_id = query.from_user.id
-    duration_str = query.data.replace("duration_", "")
+    # The duration buttons are visible to the whole group; ignore other members' presses
+    if not is_admin(user_id):
+        return
+
+    duration_str = query.data.removeprefix("duration_")
     duration_hours = LISTING_DURATIONS.get(duration_str)
     
     if not duration_hours:
         await query.edit_message_text("Invalid duration selected.")
         return
 
-    profile = db.get_profile(user_id)
+    # Handlers run concurrently, so a double-tap would post twice; the check and set
+    # have no await between them, so only the first tap gets past here
+    if context.user_data.get("listing_posting"):
+        return
+    context.user_data["listing_posting"] = True
+    try:
+        await _post_listing(query, context, user_id, duration_str, duration_hours)
+    finally:
+        context.user_data.pop("listing_posting", None)
+
+async def _post_listing(query, context: ContextTypes.DEFAULT_TYPE, user_id: int, duration_str: str, duration_hours: int) -> None:
+    """Sends the listing for post_listing_callback and records it, removing the post again if that fails."""
+    # Replacing the prompt drops the duration buttons while the post is sent
+    profile, _ = await asyncio.gather(
+        db.get_profile(user_id),
+        query.edit_message_text("Posting your listing..."),
+    )
     if not profile:
         await query.edit_message_text("Error: Profile not found.")
         return
 
     # Calculate expiry time
-    expires_at = datetime.now(timezone.utc) + timedelta(hours=duration_hours)
+    now = datetime.now(timezone.utc)
+    expires_at = now + _DURATION_DELTAS[duration_str]
+    expires_at_iso = expires_at.isoformat()
     
     # Generate message content
-    dummy_listing = {"expires_at": expires_at.isoformat(), "message_id": 0}
-    message_text = generate_listing_message(profile, dummy_listing)
-    
-    # Prepare media group
-    media_group = []
-    photos = profile.get("photo_file_ids", [])
-    videos = profile.get("video_file_ids", [])
-    
-    # Telegram only allows one caption for a media group, so we'll use the text message
-    # as the main post and the media group as a separate message or album.
-    # For simplicity, we'll send the media group first, then the text message.
-    
-    # For a rich listing, we'll send the media group first, then the text message.
-    # The requirement is for a "rich listing," which often means a single message with media.
-    # We will use the media group feature, but the main text will be sent separately.
-    # A better approach is to use the media group with the main text as the caption of the first item.
-    
-    # Let's use the caption approach for the first item in the media group.
-    if photos or videos:
-        media_items: List[Any] = []
-        
-        # Add photos
-        for i, file_id in enumerate(photos):
-            caption = message_text if i == 0 and not videos else None
-            media_items.append(InputMediaPhoto(file_id, caption=caption, parse_mode="MarkdownV2"))
-            
-        # Add videos
-        for i, file_id in enumerate(videos):
-            caption = message_text if i == 0 and not photos else None
-            media_items.append(InputMediaVideo(file_id, caption=caption, parse_mode="MarkdownV2"))
-            
-        # Telegram limit is 10 media items
-        media_items = media_items[:10]
-        
-        if media_items:
-            # Send media group
-            try:
-                # The first message in the group will have the caption
-                sent_messages = await context.bot.send_media_group(
-                    chat_id=GROUP_CHAT_ID,
-                    media=media_items,
-                    # disable_notification=True # Optional
-                )
-                sent_message = sent_messages[0]
-            except Exception as e:
-                print(f"Error sending media group: {e}. Falling back to text message.")
-                # Fallback to text message if media group fails
-                sent_message = await context.bot.send_message(
-                    chat_id=GROUP_CHAT_ID,
-                    text=message_text,
-                    parse_mode="MarkdownV2"
-                )
-        else:
-            # Only text message
-            sent_message = await context.bot.send_message(
-                chat_id=GROUP_CHAT_ID,
-                text=message_text,
-                parse_mode="MarkdownV2"
-            )
-    else:
-        # Only text message
-        sent_message = await context.bot.send_message(
-            chat_id=GROUP_CHAT_ID,
-            text=message_text,
-            parse_mode="MarkdownV2"
-        )
+    dummy_listing = {"expires_at": expires_at_iso, "message_id": 0}
+    message_text = generate_listing_message(profile, dummy_listing, now)
+    
+    sent_messages = await _send_listing(
+        context.bot, message_text, profile.get("photo_file_ids", []), profile.get("video_file_ids", [])
+    )
+    sent_message = sent_messages[0]
         
+    # Only one listing per user is allowed, so the old one must be gone first
+    cleanup = context.user_data.pop("listing_cleanup", None)
+    if cleanup:
+        await cleanup
+
     # Save active listing
     listing_data = {
         "user_id": user_id,
         "message_id": sent_message.message_id,
-        "expires_at": expires_at.isoformat(),
+        "has_media": _has_media(sent_message),
+        "expires_at": expires_at_iso,
         "duration_hours": duration_hours,
-        "last_bump_at": datetime.now(timezone.utc).isoformat()
+        "last_bump_at": now.isoformat()
     }
-    db.save_active_listing(listing_data)
+    if not await db.save_active_listing(listing_data):
+        # Without its row the post would never expire or appear in the list, so take it down
+        try:
+            await context.bot.delete_messages(chat_id=GROUP_CHAT_ID, message_ids=[m.message_id for m in sent_messages])
+        except Exception as e:
+            logger.warning("Error deleting unrecorded listing message %s: %s", sent_message.message_id, e)
+        await query.edit_message_text("Error: Your listing could not be saved, so it was not posted. Please try /available again.")
+        return
+
+    await query.edit_message_text(f"✅ Your listing is now live for {duration_hours} hours! It will automatically expire at {expires_at.strftime('%H:%M:%S UTC')}.")
     
     # Trigger list update
     await update_available_lists_now(context)
-    
-    await query.edit_message_text(f"✅ Your listing is now live for {duration_hours} hours! It will automatically expire at {expires_at.strftime('%H:%M:%S UTC')}.")
 
 async def bump_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Handles the /bump command from an admin in the group chat."""
     if not await check_admin(update, context):
         return
     
-    if str(update.effective_chat.id) != GROUP_CHAT_ID:
+    if update.effective_chat.id != GROUP_CHAT_ID_INT:
         await update.message.reply_text("Please use this command in the designated group chat.")
         return
 
     user_id = update.effective_user.id
-    listing = db.get_active_listing(user_id)
+    listing = await db.get_active_listing(user_id)
     
     if not listing:
         await update.message.reply_text("You do not have an active listing to bump. Use /available to go live.")
@@ -704,7 +742,7 @@ async def bump_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
 
     # Cooldown check
     last_bump_at = datetime.fromisoformat(listing["last_bump_at"].replace('Z', '+00:00'))
-    cooldown_end = last_bump_at + timedelta(minutes=COOLDOWN_MINUTES)
+    cooldown_end = last_bump_at + _COOLDOWN_DELTA
     now = datetime.now(timezone.utc)
     
     if now < cooldown_end:
@@ -745,17 +783,39 @@ async def bump_execute_callback(update: Update, context: ContextTypes.DEFAULT_TY
     await query.answer()
     
     user_id = query.from_user.id
+    if not is_admin(user_id):
+        return
+
+    # Like post_listing_callback: a non-blocking handler would otherwise run a double-tap
+    # as two bumps, orphaning the first re-post
+    if context.user_data.get("listing_bumping"):
+        return
+    context.user_data["listing_bumping"] = True
+    try:
+        await _bump_listing(query, context, user_id)
+    finally:
+        context.user_data.pop("listing_bumping", None)
+
+async def _bump_listing(query, context: ContextTypes.DEFAULT_TYPE, user_id: int) -> None:
+    """Re-posts the listing for bump_execute_callback and points its record at the new post."""
     listing_id = context.user_data.get("bump_listing_id")
     
     if not listing_id:
         await query.edit_message_text("Error: Could not find listing data for bump.")
         return
 
-    listing = db.get_active_listing(user_id)
+    listing, profile = await asyncio.gather(
+        db.get_active_listing(user_id),
+        db.get_profile(user_id),
+    )
     if not listing or listing["id"] != listing_id:
         await query.edit_message_text("Error: Active listing not found or mismatch.")
         return
 
+    if not profile:
+        await query.edit_message_text("Error: Profile not found for re-post.")
+        return
+
     # 1. Delete the old message
     try:
         await context.bot.delete_message(
@@ -763,7 +823,7 @@ async def bump_execute_callback(update: Update, context: ContextTypes.DEFAULT_TY
             message_id=listing["message_id"]
         )
     except Exception as e:
-        print(f"Error deleting old listing message {listing['message_id']} during bump: {e}")
+        logger.warning("Error deleting old listing message %s during bump: %s", listing["message_id"], e)
 
     # 2. Calculate new expiry time
     now = datetime.now(timezone.utc)
@@ -781,31 +841,23 @@ async def bump_execute_callback(update: Update, context: ContextTypes.DEFAULT_TY
         await query.edit_message_text("Invalid bump option selected.")
         return
 
-    profile = db.get_profile(user_id)
-    if not profile:
-        await query.edit_message_text("Error: Profile not found for re-post.")
-        return
-
     # 3. Post the new message (re-post logic is the same as /available)
     dummy_listing = {"expires_at": new_expires_at.isoformat(), "message_id": 0}
-    message_text = generate_listing_message(profile, dummy_listing)
+    message_text = generate_listing_message(profile, dummy_listing, now)
     
-    # Simplified re-post: only text for now, media group logic is complex to re-send
-    # A full implementation would re-send the media group with the new message as caption
-    sent_message = await context.bot.send_message(
-        chat_id=GROUP_CHAT_ID,
-        text=message_text,
-        parse_mode="MarkdownV2"
-    )
+    sent_message = (await _send_listing(
+        context.bot, message_text, profile.get("photo_file_ids", []), profile.get("video_file_ids", [])
+    ))[0]
     
     # 4. Update the active listing record
     update_data = {
         "message_id": sent_message.message_id,
+        "has_media": _has_media(sent_message),
         "expires_at": new_expires_at.isoformat(),
         "duration_hours": duration_hours,
         "last_bump_at": now.isoformat()
     }
-    db.update_active_listing(listing_id, update_data)
+    await db.update_active_listing(listing_id, update_data)
     
     # 5. Trigger list update
     await update_available_lists_now(context)
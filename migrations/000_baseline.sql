@@ -0,0 +1,44 @@
+-- Baseline schema for the Supabase (Postgres) database, matching what db.py and the
+-- handlers read and write. Apply once on a fresh project, then every numbered migration
+-- after it in order.
+
+CREATE TABLE IF NOT EXISTS profiles (
+    user_id                 BIGINT PRIMARY KEY,        -- Telegram user id of the admin/model
+    name_subject            TEXT,
+    offer_types             TEXT,                      -- JSON-encoded list of service names
+    inperson_incall_outcall TEXT,
+    inperson_location       TEXT,
+    facetime_platforms      TEXT,
+    facetime_payment        TEXT,
+    custom_payment          TEXT,
+    custom_delivery         TEXT,
+    other_service           TEXT,
+    about                   TEXT,
+    contact_method          TEXT,                      -- text_call | email | telegram
+    phone                   TEXT,
+    email                   TEXT,
+    telegram_username       TEXT,
+    social_links            TEXT,
+    rates                   TEXT,
+    disclaimer              TEXT,
+    allow_comments          BOOLEAN NOT NULL DEFAULT FALSE,
+    photo_file_ids          JSONB NOT NULL DEFAULT '[]'::jsonb,  -- Telegram file_ids
+    video_file_ids          JSONB NOT NULL DEFAULT '[]'::jsonb,
+    created_at              TIMESTAMPTZ,
+    updated_at              TIMESTAMPTZ
+);
+
+CREATE TABLE IF NOT EXISTS active_listings (
+    id             UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id        BIGINT NOT NULL REFERENCES profiles (user_id) ON DELETE CASCADE,
+    message_id     BIGINT NOT NULL,                    -- Listing post in the group chat
+    expires_at     TIMESTAMPTZ NOT NULL,
+    duration_hours INTEGER NOT NULL,
+    last_bump_at   TIMESTAMPTZ NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS list_messages (
+    type       TEXT PRIMARY KEY,                       -- pinned | chat
+    message_id BIGINT NOT NULL,
+    updated_at TIMESTAMPTZ
+);
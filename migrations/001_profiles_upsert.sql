@@ -0,0 +1,7 @@
+-- save_profile upserts on user_id in a single request instead of SELECT + INSERT/UPDATE.
+-- The upsert's on_conflict target needs a unique constraint on user_id, which the primary
+-- key in 000_baseline.sql already is. created_at must be filled by the database since the
+-- client no longer knows whether the row is new.
+
+ALTER TABLE profiles
+    ALTER COLUMN created_at SET DEFAULT now();
@@ -0,0 +1,11 @@
+-- Indexes for the active_listings lookups in db.py. Postgres doesn't index foreign keys or
+-- plain columns on its own, so without these those lookups are sequential scans.
+-- profiles(user_id) and list_messages(type) are primary keys, which are already indexed.
+
+-- get_active_listing / load_active_listings, and the ON DELETE CASCADE from profiles.
+-- One listing per user: /available replaces the previous listing before posting a new one.
+CREATE UNIQUE INDEX IF NOT EXISTS active_listings_user_id_idx ON active_listings (user_id);
+
+-- get_all_active_listings_with_profiles orders the unexpired listings by last_bump_at DESC;
+-- its expires_at filter uses the index from 004_expires_at_index.sql.
+CREATE INDEX IF NOT EXISTS active_listings_last_bump_idx ON active_listings (last_bump_at DESC);
@@ -0,0 +1,25 @@
+-- Timestamps are set by the database instead of by the bot, so they come from one
+-- clock and don't have to be sent with every write.
+-- Inserts use the column defaults; updates (including upserts that hit an existing row)
+-- go through moddatetime, which overwrites updated_at with the current time.
+
+CREATE EXTENSION IF NOT EXISTS moddatetime WITH SCHEMA extensions;
+
+ALTER TABLE profiles
+    ALTER COLUMN updated_at SET DEFAULT now();
+
+ALTER TABLE list_messages
+    ALTER COLUMN updated_at SET DEFAULT now();
+
+ALTER TABLE active_listings
+    ALTER COLUMN last_bump_at SET DEFAULT now();
+
+DROP TRIGGER IF EXISTS set_updated_at ON profiles;
+CREATE TRIGGER set_updated_at
+    BEFORE UPDATE ON profiles
+    FOR EACH ROW EXECUTE FUNCTION extensions.moddatetime(updated_at);
+
+DROP TRIGGER IF EXISTS set_updated_at ON list_messages;
+CREATE TRIGGER set_updated_at
+    BEFORE UPDATE ON list_messages
+    FOR EACH ROW EXECUTE FUNCTION extensions.moddatetime(updated_at);
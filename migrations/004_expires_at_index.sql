@@ -0,0 +1,3 @@
+-- get_expired_listings and get_all_active_listings_with_profiles filter on expires_at
+-- against now() every scheduler tick.
+CREATE INDEX IF NOT EXISTS active_listings_expires_at_idx ON active_listings (expires_at);
@@ -0,0 +1,4 @@
+-- Whether a listing was posted as an album with the text as its caption. The scheduler's
+-- countdown has to edit the caption of those, since Telegram rejects editMessageText on media.
+ALTER TABLE active_listings
+    ADD COLUMN IF NOT EXISTS has_media BOOLEAN NOT NULL DEFAULT FALSE;
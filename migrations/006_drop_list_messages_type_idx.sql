@@ -0,0 +1,3 @@
+-- list_messages.type is the primary key, so the unique index an earlier version of
+-- 002_lookup_indexes.sql created on it was a duplicate that every write had to maintain.
+DROP INDEX IF EXISTS list_messages_type_idx;
@@ -0,0 +1,3 @@
+-- profiles.user_id is the primary key, so the unique index an earlier version of
+-- 001_profiles_upsert.sql created on it was a duplicate that every write had to maintain.
+DROP INDEX IF EXISTS profiles_user_id_idx;
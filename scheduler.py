@@ -1,136 +1,176 @@
-from apscheduler.schedulers.background import BackgroundScheduler
-from telegram import Bot
+import asyncio
+import itertools
+import logging
 from datetime import datetime, timezone
-from typing import Dict, Any
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from cachetools import TTLCache
+from telegram import Bot
+from typing import Dict, Any, List
 import db
 from utils.constants import (
-    GROUP_CHAT_ID, TABLE_ACTIVE_LISTINGS, LIST_TYPE_PINNED, LIST_TYPE_CHAT
+    GROUP_CHAT_ID, GROUP_CHAT_ID_INT, TABLE_ACTIVE_LISTINGS, TABLE_PROFILES, LIST_TYPE_PINNED, LIST_TYPE_CHAT,
+    CACHE_MAX_SIZE, EDIT_DEDUP_TTL_SECONDS, SCHEDULER_CONCURRENCY,
+    SCHEDULER_TICK_SECONDS, LIST_REFRESH_EVERY_TICKS
 )
-from utils.formatting import format_time_remaining, generate_list_message
+from utils.formatting import generate_listing_message, generate_list_message
+
+logger = logging.getLogger(__name__)
+
+# Runs the (async) jobs directly on the bot's event loop, so they share its caches and HTTP pools
+scheduler = AsyncIOScheduler()
 
-scheduler = BackgroundScheduler()
+# Hash of the text last sent to each message id. Telegram rejects edits that change nothing,
+# so those are skipped without a round trip; entries for deleted messages simply expire.
+_last_sent: TTLCache = TTLCache(maxsize=CACHE_MAX_SIZE, ttl=EDIT_DEDUP_TTL_SECONDS)
+
+# Caps how many Telegram calls a job has in flight at once; the bot's rate limiter
+# still paces them to Telegram's flood limits.
+_telegram_slots = asyncio.Semaphore(SCHEDULER_CONCURRENCY)
+
+async def _edit_if_changed(bot: Bot, message_id: int, text: str, caption: bool = False) -> bool:
+    """
+    Edits a group message to `text` unless that is what it already shows. Returns True if an edit was sent.
+    With `caption`, the text is the caption of a media message.
+    """
+    digest = hash(text)
+    if _last_sent.get(message_id) == digest:
+        return False
+    if caption:
+        await bot.edit_message_caption(
+            chat_id=GROUP_CHAT_ID,
+            message_id=message_id,
+            caption=text,
+            parse_mode="MarkdownV2"
+        )
+    else:
+        await bot.edit_message_text(
+            chat_id=GROUP_CHAT_ID,
+            message_id=message_id,
+            text=text,
+            parse_mode="MarkdownV2"
+        )
+    _last_sent[message_id] = digest
+    return True
 
 def get_profiles_for_listings(listings: list[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
-    """Helper to fetch profiles for a list of listings."""
-    user_ids = [listing["user_id"] for listing in listings]
-    profiles = {}
-    for user_id in user_ids:
-        profile = db.get_profile(user_id)
-        if profile:
-            profiles[user_id] = profile
-    return profiles
-
-def update_available_lists(bot: Bot):
-    """Updates both the Pinned List and the Chat List."""
-    print("Running update_available_lists job...")
+    """Helper to index the profiles embedded by db.get_all_active_listings_with_profiles by user_id."""
+    return {listing["user_id"]: listing[TABLE_PROFILES] for listing in listings if listing.get(TABLE_PROFILES)}
+
+async def update_available_lists(bot: Bot, active_listings: List[Dict[str, Any]] | None = None):
+    """Updates both the Pinned List and the Chat List, from `active_listings` if already fetched."""
+    logger.debug("Running update_available_lists job...")
     
-    active_listings = db.get_all_active_listings()
+    if active_listings is None:
+        active_listings = await db.get_all_active_listings_with_profiles()
+    if active_listings is None:
+        # The query failed; keep the pinned list as it is rather than blanking it
+        logger.warning("Could not fetch active listings. Pinned List left unchanged.")
+        return
     profiles = get_profiles_for_listings(active_listings)
     
-    if not active_listings:
-        print("No active listings found. Skipping list update.")
-        return
-
-    list_content = generate_list_message(active_listings, profiles, int(GROUP_CHAT_ID))
+    # An empty list is still rendered, so the pinned message drops the last expired listing
+    list_content = generate_list_message(active_listings, profiles, GROUP_CHAT_ID_INT)
     
     # 1. Update Pinned List
-    pinned_msg_data = db.get_list_message(LIST_TYPE_PINNED)
+    pinned_msg_data = await db.get_list_message(LIST_TYPE_PINNED)
     if pinned_msg_data:
         try:
-            bot.edit_message_text(
-                chat_id=GROUP_CHAT_ID,
-                message_id=pinned_msg_data["message_id"],
-                text=list_content,
-                parse_mode="MarkdownV2"
-            )
-            print(f"Updated Pinned List message {pinned_msg_data['message_id']}")
-        except Exception as e:
-            print(f"Error updating Pinned List: {e}")
+            if await _edit_if_changed(bot, pinned_msg_data["message_id"], list_content):
+                logger.debug("Updated Pinned List message %s", pinned_msg_data["message_id"])
+        except Exception:
+            logger.exception("Error updating Pinned List")
             # If message is gone, we should probably try to re-pin a new one, but for now, just log.
     else:
-        print("Pinned List message ID not found in DB. Cannot update.")
+        logger.warning("Pinned List message ID not found in DB. Cannot update.")
 
     # 2. Update Chat List (No need to delete/repost, as member handler does that)
     # The member handler's /available command is the primary way to refresh the chat list.
     # We only update the pinned list here to keep it current.
 
-def update_countdown_timers(bot: Bot):
-    """Job to update the countdown timer on all active listing messages."""
-    print("Running update_countdown_timers job...")
-    active_listings = db.get_all_active_listings()
+async def _update_countdown(bot: Bot, listing: Dict[str, Any], now: datetime) -> None:
+    """Re-renders one listing message with its countdown as of `now`."""
+    # We need the full message content to edit the caption/text
+    # For simplicity, we'll re-generate the entire message with the new countdown
+    profile = listing.get(TABLE_PROFILES)
+    if not profile:
+        logger.warning("Profile not found for listing %s", listing["id"])
+        return
+
+    # A malformed profile row must not escape the tick's gather and stop the list refresh
+    try:
+        new_message_text = generate_listing_message(profile, listing, now)
+    except Exception:
+        logger.exception("Error rendering listing %s", listing["id"])
+        return
     
-    for listing in active_listings:
-        time_remaining = format_time_remaining(listing["expires_at"])
-        
-        # We need the full message content to edit the caption/text
-        # For simplicity, we'll re-generate the entire message with the new countdown
-        profile = db.get_profile(listing["user_id"])
-        if not profile:
-            print(f"Profile not found for listing {listing['id']}")
-            continue
-            
-        new_message_text = db.generate_listing_message(profile, listing)
-        
+    async with _telegram_slots:
         try:
-            # Assuming the listing is a text message or a media group with a caption
-            # We use edit_message_text for simplicity, assuming the media is handled separately
-            # A full implementation would need to check if it's a media group and use edit_message_caption
-            bot.edit_message_text(
-                chat_id=GROUP_CHAT_ID,
-                message_id=listing["message_id"],
-                text=new_message_text,
-                parse_mode="MarkdownV2"
-            )
+            # Albums carry the listing as the caption of their first item
+            await _edit_if_changed(bot, listing["message_id"], new_message_text, caption=listing.get("has_media", False))
         except Exception as e:
-            print(f"Error updating countdown for listing {listing['id']}: {e}")
+            logger.warning("Error updating countdown for listing %s: %s", listing["id"], e)
             # If the message is gone, it will be cleaned up by the next job run
 
-def cleanup_expired_listings(bot: Bot):
-    """Job to find and delete expired listings."""
-    print("Running cleanup_expired_listings job...")
-    active_listings = db.get_all_active_listings()
-    now = datetime.now(timezone.utc)
+async def _delete_expired_message(bot: Bot, listing: Dict[str, Any]) -> None:
+    """Removes an expired listing's message from the group chat."""
+    logger.info("Listing %s for user %s has expired.", listing["id"], listing["user_id"])
     
-    listings_expired = False
-    
-    for listing in active_listings:
-        expiry_time = datetime.fromisoformat(listing["expires_at"].replace('Z', '+00:00'))
-        
-        if expiry_time <= now:
-            listings_expired = True
-            print(f"Listing {listing['id']} for user {listing['user_id']} has expired.")
-            
-            # 1. Delete message from group chat
-            try:
-                bot.delete_message(chat_id=GROUP_CHAT_ID, message_id=listing["message_id"])
-                print(f"Deleted message {listing['message_id']} from chat.")
-            except Exception as e:
-                print(f"Error deleting message {listing['message_id']}: {e}")
-                
-            # 2. Delete record from active_listings table
-            if db.delete_active_listing(listing["id"]):
-                print(f"Deleted listing record {listing['id']} from DB.")
-            else:
-                print(f"Failed to delete listing record {listing['id']} from DB.")
-
-    if listings_expired:
-        # 3. Update the available lists if any listing expired
-        update_available_lists(bot)
+    _last_sent.pop(listing["message_id"], None)
+    async with _telegram_slots:
+        try:
+            await bot.delete_message(chat_id=GROUP_CHAT_ID, message_id=listing["message_id"])
+            logger.debug("Deleted message %s from chat.", listing["message_id"])
+        except Exception as e:
+            logger.warning("Error deleting message %s: %s", listing["message_id"], e)
+
+async def _delete_expired_records(listings: List[Dict[str, Any]]) -> None:
+    """Removes the expired listings' rows with one bulk delete."""
+    expired_ids = [listing["id"] for listing in listings]
+    deleted = await db.delete_active_listings(expired_ids)
+    if deleted < len(expired_ids):
+        logger.warning("Deleted %s of %s expired listing records from DB.", deleted, len(expired_ids))
+    else:
+        logger.debug("Deleted %s expired listing records from DB.", deleted)
+
+# Counts tick() runs so the pinned list is also refreshed every few ticks
+_ticks = itertools.count()
+
+async def tick(bot: Bot):
+    """Periodic job: expires old listings, updates countdowns and refreshes the pinned list from one snapshot."""
+    logger.debug("Running tick job...")
+    # Postgres splits the listings by expiry; only live ones need the full profile to re-render
+    expired, active = await asyncio.gather(
+        db.get_expired_listings(),
+        db.get_all_active_listings_with_profiles("*"),
+    )
+
+    # One clock reading for the whole pass, so every countdown agrees
+    now = datetime.now(timezone.utc)
+    await asyncio.gather(
+        *(_delete_expired_message(bot, listing) for listing in expired),
+        *(_update_countdown(bot, listing, now) for listing in active or []),
+        *([_delete_expired_records(expired)] if expired else []),
+    )
+
+    # Refresh the list right away if anything expired, otherwise periodically just in case
+    refresh_due = next(_ticks) % LIST_REFRESH_EVERY_TICKS == 0
+    # A failed active query (None) is skipped; only a real empty result renders the empty list
+    if active is not None and (expired or refresh_due):
+        await update_available_lists(bot, active)
 
 def start_scheduler(bot: Bot):
-    """Starts the APScheduler with the defined jobs."""
-    # Pass the bot instance to the job functions
-    scheduler.add_job(update_countdown_timers, 'interval', seconds=60, args=[bot], id='countdown_timer')
-    scheduler.add_job(cleanup_expired_listings, 'interval', seconds=60, args=[bot], id='expired_cleanup')
-    
-    # Also add a job to update the lists periodically, just in case
-    scheduler.add_job(update_available_lists, 'interval', minutes=5, args=[bot], id='list_periodic_update')
+    """Starts the APScheduler with the defined jobs. Must be called from the bot's event loop."""
+    scheduler.configure(event_loop=asyncio.get_running_loop())
+
+    # Pass the bot instance to the job function
+    scheduler.add_job(tick, 'interval', seconds=SCHEDULER_TICK_SECONDS, args=[bot], id='tick')
     
     scheduler.start()
-    print("APScheduler started.")
+    logger.info("APScheduler started.")
 
 def stop_scheduler():
     """Stops the APScheduler."""
     if scheduler.running:
-        scheduler.shutdown()
-        print("APScheduler stopped.")
+        # Jobs run as tasks on the loop, so there are no worker threads to wait for
+        scheduler.shutdown(wait=False)
+        logger.info("APScheduler stopped.")
@@ -10,6 +10,7 @@ APPROVED_ADMIN_IDS = [int(uid.strip()) for uid in os.getenv("APPROVED_ADMIN_IDS"
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 GROUP_CHAT_ID = os.getenv("GROUP_CHAT_ID") # The ID of the group chat where the bot operates
+GROUP_CHAT_ID_INT = int(GROUP_CHAT_ID) if GROUP_CHAT_ID else None # For comparing against update.effective_chat.id
 
 # --- Bot Configuration ---
 COOLDOWN_MINUTES = 30
@@ -19,12 +20,55 @@ LISTING_DURATIONS = {
     "4h": 4,
     "6h": 6,
 }
+MAX_LISTING_PHOTOS = 10
+MAX_LISTING_VIDEOS = 4
+
+# --- Scheduler ---
+SCHEDULER_TICK_SECONDS = 60
+LIST_REFRESH_EVERY_TICKS = 5 # Pinned list refresh when nothing expired (every 5 min)
+# How long the hash of a message's last edit is remembered (longer than the 5 min list refresh)
+EDIT_DEDUP_TTL_SECONDS = 600
+SCHEDULER_CONCURRENCY = 20 # Max Telegram calls in flight per job
+
+# --- Telegram HTTP Connection Pool ---
+TELEGRAM_HTTP_POOL_SIZE = 100
+TELEGRAM_HTTP_POOL_TIMEOUT_SECONDS = 5.0
+# Times a flood-limited (429) call is retried after the Retry-After Telegram sends
+TELEGRAM_FLOOD_MAX_RETRIES = 3
+
+# --- Database Read Cache ---
+CACHE_MAX_SIZE = 1024
+CACHE_TTL_SECONDS = 30
+PROFILE_CACHE_TTL_SECONDS = 60
+LIST_MESSAGE_CACHE_TTL_SECONDS = 600
+
+# --- Database HTTP Connection Pool ---
+DB_HTTP_MAX_CONNECTIONS = 20
+DB_HTTP_MAX_KEEPALIVE_CONNECTIONS = 10
+DB_HTTP_TIMEOUT_SECONDS = 10.0
+
+# --- Database Retries ---
+DB_RETRY_ATTEMPTS = 5
+DB_RETRY_MAX_WAIT_SECONDS = 4
+
+# --- Database Rate Limit ---
+# Stays below the Supabase free-tier quota of 500 requests/minute
+DB_RATE_LIMIT_REQUESTS = 450
+DB_RATE_LIMIT_PERIOD_SECONDS = 60
+
+# --- Database Batch Loader ---
+LOADER_BATCH_DELAY_SECONDS = 0.01 # How long to wait for more keys before querying
+LOADER_MAX_BATCH = 100 # Max ids per IN (...) query
 
 # --- Database Table Names ---
 TABLE_PROFILES = "profiles"
 TABLE_ACTIVE_LISTINGS = "active_listings"
 TABLE_LIST_MESSAGES = "list_messages"
 
+# --- Column Projections ---
+# Profile columns read by generate_list_message (the full row carries long text and media ids)
+PROFILE_LIST_COLUMNS = "user_id,name_subject,allow_comments"
+
 # --- List Message Types ---
 LIST_TYPE_PINNED = "pinned"
 LIST_TYPE_CHAT = "chat"
@@ -1,167 +1,208 @@
 from datetime import datetime, timezone
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
+from functools import lru_cache
 import json
 
-def format_time_remaining(expires_at: str) -> str:
-    """Calculates and formats the time remaining until expiration."""
+def format_time_remaining(expires_at: str, now: datetime | None = None) -> str:
+    """Calculates and formats the time remaining until expiration, as of `now` (default: the current time)."""
     try:
         # Parse the ISO format string from the database
         expiry_time = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
-        now = datetime.now(timezone.utc)
+        if now is None:
+            now = datetime.now(timezone.utc)
         time_diff = expiry_time - now
         
         if time_diff.total_seconds() <= 0:
             return "EXPIRED"
 
-        total_seconds = int(time_diff.total_seconds())
-        hours = total_seconds // 3600
-        minutes = (total_seconds % 3600) // 60
-        seconds = total_seconds % 60
+        # Minute resolution: listings are only re-rendered once a minute, so a seconds
+        # field would be stale on arrival and make every tick's text differ.
+        total_minutes = int(time_diff.total_seconds()) // 60
+        hours, minutes = divmod(total_minutes, 60)
 
         if hours > 0:
-            return f"{hours}h {minutes}m {seconds}s"
+            return f"{hours}h {minutes}m"
         elif minutes > 0:
-            return f"{minutes}m {seconds}s"
+            return f"{minutes}m"
         else:
-            return f"{seconds}s"
+            return "<1m"
     except Exception:
         return "N/A"
 
-def generate_listing_message(profile: Dict[str, Any], listing: Dict[str, Any]) -> str:
+# Escape characters for MarkdownV2: _, *, [, ], (, ), ~, `, >, #, +, -, =, |, {, }, ., ! and the backslash
+# A fixed per-character substitution, so str.translate does it in one pass in C
+_MARKDOWN_V2_TABLE = str.maketrans({char: "\\" + char for char in "_*[]()~`>#+-=|{}.!\\"})
+
+# Memoized: the same names, services and list entries are escaped on every refresh
+@lru_cache(maxsize=4096)
+def escape_markdown_v2(text: str) -> str:
+    if not text:
+        return ""
+    # Only escape characters that are not part of a link or already escaped
+    # This is a simplified escape, full implementation is complex.
+    # For simplicity, we'll focus on common ones and assume we control the structure.
+    # A safer approach is to use HTML parsing mode, but requirements specified Markdown.
+    return text.translate(_MARKDOWN_V2_TABLE)
+
+@lru_cache(maxsize=256)
+def decode_offer_types(raw: str | None) -> Tuple[str, ...]:
+    """Decodes the JSON-encoded offer_types column, memoized since the same few values recur on every refresh."""
+    return tuple(json.loads(raw)) if raw else ()
+
+# Every profile field the listing body reads, with the value shown when it is missing;
+# together the fields are its cache key
+_LISTING_BODY_DEFAULTS: Dict[str, Any] = {
+    "name_subject": "Model Available",
+    "about": "No description provided.",
+    "offer_types": None,
+    "inperson_incall_outcall": "N/A",
+    "inperson_location": "N/A",
+    "facetime_platforms": "N/A",
+    "facetime_payment": "N/A",
+    "custom_payment": "N/A",
+    "custom_delivery": "N/A",
+    "other_service": "N/A",
+    "rates": "Rates available upon request.",
+    "contact_method": "telegram",
+    "phone": "N/A",
+    "email": "N/A",
+    "telegram_username": "",
+    "social_links": "",
+    "disclaimer": "",
+}
+
+def generate_listing_message(profile: Dict[str, Any], listing: Dict[str, Any], now: datetime | None = None) -> str:
     """
     Generates the rich Telegram message content for a model's availability listing.
-    Uses MarkdownV2 for formatting.
+    Uses MarkdownV2 for formatting. The countdown is measured from `now` (default: the current time).
     """
-    
-    # Escape characters for MarkdownV2: _, *, [, ], (, ), ~, `, >, #, +, -, =, |, {, }, ., !
-    def escape_markdown_v2(text: str) -> str:
-        if not text:
-            return ""
-        # Only escape characters that are not part of a link or already escaped
-        # This is a simplified escape, full implementation is complex.
-        # For simplicity, we'll focus on common ones and assume we control the structure.
-        # A safer approach is to use HTML parsing mode, but requirements specified Markdown.
-        # Let's use a basic escape for now.
-        return text.replace('_', '\\_').replace('*', '\\*').replace('[', '\\[').replace(']', '\\]').replace('(', '\\(').replace(')', '\\)').replace('~', '\\~').replace('`', '\\`').replace('>', '\\>').replace('#', '\\#').replace('+', '\\+').replace('-', '\\-').replace('=', '\\=').replace('|', '\\|').replace('{', '\\{').replace('}', '\\}').replace('.', '\\.').replace('!', '\\!')
+    # Only the countdown changes between renders of the same profile, so the
+    # escaped body is memoized on the profile's field values.
+    body = _render_listing_body(tuple((field, profile[field]) for field in _LISTING_BODY_DEFAULTS if field in profile))
+
+    # --- Countdown ---
+    time_remaining = format_time_remaining(listing["expires_at"], now)
+    return body + f"*Expires in:* {time_remaining}"
+
+# MarkdownV2 horizontal rule closing the listing body, above the countdown
+_HR = "\\-" * 32 + "\n"
+
+@lru_cache(maxsize=512)
+def _render_listing_body(fields: Tuple[Tuple[str, Any], ...]) -> str:
+    """Renders everything in a listing above the countdown."""
+    # One merge fills in every missing field, so the sections below just index
+    profile = _LISTING_BODY_DEFAULTS | dict(fields)
 
     # --- Header ---
-    name_subject = escape_markdown_v2(profile.get("name_subject", "Model Available"))
-    message = f"*{name_subject}*\n\n"
+    name_subject = escape_markdown_v2(profile["name_subject"])
+    parts = [f"*{name_subject}*\n\n"]
 
     # --- About ---
-    about = escape_markdown_v2(profile.get("about", "No description provided."))
-    message += f"\\_About\\_\n{about}\n\n"
+    about = escape_markdown_v2(profile["about"])
+    parts.append(f"\\_About\\_\n{about}\n\n")
 
     # --- Services Offered ---
-    offer_types = json.loads(profile.get("offer_types", "[]"))
+    offer_types = decode_offer_types(profile["offer_types"])
     if offer_types:
-        message += "*Services Offered:*\n"
+        parts.append("*Services Offered:*\n")
         for service in offer_types:
-            message += f"• {escape_markdown_v2(service)}\n"
-        message += "\n"
+            parts.append(f"• {escape_markdown_v2(service)}\n")
+        parts.append("\n")
         
         # Detailed service info
         if "In-Person" in offer_types:
-            incall_outcall = escape_markdown_v2(profile.get("inperson_incall_outcall", "N/A"))
-            location = escape_markdown_v2(profile.get("inperson_location", "N/A"))
-            message += f"\\_In\\-Person Details\\_\nLocation: {location}\nType: {incall_outcall}\n\n"
+            incall_outcall = escape_markdown_v2(profile["inperson_incall_outcall"])
+            location = escape_markdown_v2(profile["inperson_location"])
+            parts.append(f"\\_In\\-Person Details\\_\nLocation: {location}\nType: {incall_outcall}\n\n")
         
         if "Facetime Shows" in offer_types:
-            platforms = escape_markdown_v2(profile.get("facetime_platforms", "N/A"))
-            payment = escape_markdown_v2(profile.get("facetime_payment", "N/A"))
-            message += f"\\_Facetime Details\\_\nPlatforms: {platforms}\nPayment: {payment}\n\n"
+            platforms = escape_markdown_v2(profile["facetime_platforms"])
+            payment = escape_markdown_v2(profile["facetime_payment"])
+            parts.append(f"\\_Facetime Details\\_\nPlatforms: {platforms}\nPayment: {payment}\n\n")
 
         if "Custom Content" in offer_types:
-            payment = escape_markdown_v2(profile.get("custom_payment", "N/A"))
-            delivery = escape_markdown_v2(profile.get("custom_delivery", "N/A"))
-            message += f"\\_Custom Content Details\\_\nPayment: {payment}\nDelivery: {delivery}\n\n"
+            payment = escape_markdown_v2(profile["custom_payment"])
+            delivery = escape_markdown_v2(profile["custom_delivery"])
+            parts.append(f"\\_Custom Content Details\\_\nPayment: {payment}\nDelivery: {delivery}\n\n")
 
         if "Other" in offer_types:
-            other_service = escape_markdown_v2(profile.get("other_service", "N/A"))
-            message += f"\\_Other Service\\_\n{other_service}\n\n"
+            other_service = escape_markdown_v2(profile["other_service"])
+            parts.append(f"\\_Other Service\\_\n{other_service}\n\n")
 
     # --- Rates ---
-    rates = escape_markdown_v2(profile.get("rates", "Rates available upon request."))
-    message += f"*Rates:*\n{rates}\n\n"
+    rates = escape_markdown_v2(profile["rates"])
+    parts.append(f"*Rates:*\n{rates}\n\n")
 
     # --- Contact ---
-    contact_method = profile.get("contact_method", "telegram")
+    contact_method = profile["contact_method"]
     contact_info = ""
     if contact_method == "text_call":
-        contact_info = escape_markdown_v2(profile.get("phone", "N/A"))
-        message += f"*Contact (Text/Call):* {contact_info}\n"
+        contact_info = escape_markdown_v2(profile["phone"])
+        parts.append(f"*Contact (Text/Call):* {contact_info}\n")
     elif contact_method == "email":
-        contact_info = escape_markdown_v2(profile.get("email", "N/A"))
-        message += f"*Contact (Email):* {contact_info}\n"
+        contact_info = escape_markdown_v2(profile["email"])
+        parts.append(f"*Contact (Email):* {contact_info}\n")
     elif contact_method == "telegram":
-        username = profile.get("telegram_username", "")
+        username = profile["telegram_username"]
         if username.startswith("@"):
             username = username[1:]
         contact_info = f"@{username}"
-        message += f"*Contact (Telegram):* [{contact_info}](https://t.me/{username})\n"
+        parts.append(f"*Contact (Telegram):* [{contact_info}](https://t.me/{username})\n")
     
     # --- Social Links ---
-    social_links_raw = profile.get("social_links", "")
+    social_links_raw = profile["social_links"]
     if social_links_raw:
-        message += "*Social Links:*\n"
+        parts.append("*Social Links:*\n")
         # Simple split by comma or newline
         links = [link.strip() for link in social_links_raw.replace('\n', ',').split(',') if link.strip()]
         for link in links:
             # Assuming the link is a full URL or a recognizable handle
-            message += f"• {escape_markdown_v2(link)}\n"
-        message += "\n"
+            parts.append(f"• {escape_markdown_v2(link)}\n")
+        parts.append("\n")
 
     # --- Disclaimer ---
-    disclaimer = escape_markdown_v2(profile.get("disclaimer", ""))
+    disclaimer = escape_markdown_v2(profile["disclaimer"])
     if disclaimer:
-        message += f"\\_Disclaimer\\_\n{disclaimer}\n\n"
+        parts.append(f"\\_Disclaimer\\_\n{disclaimer}\n\n")
 
-    # --- Countdown ---
-    time_remaining = format_time_remaining(listing["expires_at"])
-    message += f"\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\-\\n"
-    message += f"*Expires in:* {time_remaining}"
+    parts.append(_HR)
 
-    return message
+    return "".join(parts)
 
 def generate_list_message(active_listings: List[Dict[str, Any]], profiles: Dict[int, Dict[str, Any]], chat_id: int) -> str:
     """
     Generates the content for the Pinned or Chat list message.
     Uses MarkdownV2 for formatting.
     """
-    
-    # Escape characters for MarkdownV2
-    def escape_markdown_v2(text: str) -> str:
-        if not text:
-            return ""
-        return text.replace('_', '\\_').replace('*', '\\*').replace('[', '\\[').replace(']', '\\]').replace('(', '\\(').replace(')', '\\)').replace('~', '\\~').replace('`', '\\`').replace('>', '\\>').replace('#', '\\#').replace('+', '\\+').replace('-', '\\-').replace('=', '\\=').replace('|', '\\|').replace('{', '\\{').replace('}', '\\}').replace('.', '\\.').replace('!', '\\!')
-
-    count = len(active_listings)
-    message = f"*AVAILABLE NOW ({count} available)*\n\n"
+    # Reduce the rows to the few values the list shows, so an unchanged set of
+    # listings reuses the previous render
+    entries = tuple(
+        (i + 1, profile.get("name_subject", f"Model {listing['user_id']}"), bool(profile.get("allow_comments", False)), listing["message_id"])
+        for i, listing in enumerate(active_listings)
+        if (profile := profiles.get(listing["user_id"]))
+    )
+    return _render_list_message(len(active_listings), entries, chat_id)
+
+@lru_cache(maxsize=64)
+def _render_list_message(count: int, entries: Tuple[Tuple[int, str, bool, int], ...], chat_id: int) -> str:
+    """Renders the list message from (position, name, allow_comments, message_id) entries."""
+    header = f"*AVAILABLE NOW ({count} available)*\n\n"
 
     if count == 0:
-        message += "No models are currently available\\. Check back soon\\!"
-        return message
+        return header + "No models are currently available\\. Check back soon\\!"
 
-    for i, listing in enumerate(active_listings):
-        user_id = listing["user_id"]
-        profile = profiles.get(user_id)
-        
-        if not profile:
-            continue
+    # Telegram message link format: t.me/c/{chat_id}/{message_id}
+    # The chat_id needs to be converted for public link format: remove the -100 prefix
+    # For private groups, the link might not work, but we use the official format.
+    # The group chat ID is usually -100XXXXXXXXXX. We need the XXXXXXXXXX part.
+    link_chat_id = str(chat_id).replace("-100", "")
 
-        name_subject = escape_markdown_v2(profile.get("name_subject", f"Model {user_id}"))
-        allow_comments = profile.get("allow_comments", False)
-        
-        # Telegram message link format: t.me/c/{chat_id}/{message_id}
-        # The chat_id needs to be converted for public link format: remove the -100 prefix
-        # For private groups, the link might not work, but we use the official format.
-        # The group chat ID is usually -100XXXXXXXXXX. We need the XXXXXXXXXX part.
-        link_chat_id = str(chat_id).replace("-100", "")
-        message_link = f"https://t.me/c/{link_chat_id}/{listing['message_id']}"
-        
+    lines = []
+    for position, name_subject, allow_comments, message_id in entries:
+        message_link = f"https://t.me/c/{link_chat_id}/{message_id}"
         comment_icon = "💬" if allow_comments else ""
         
         # Numbered list with link to the post
-        message += f"{i+1}\\. {name_subject} {comment_icon} [View Post]({message_link})\n"
+        lines.append(f"{position}\\. {escape_markdown_v2(name_subject)} {comment_icon} [View Post]({message_link})\n")
 
-    return message
+    return header + "".join(lines)